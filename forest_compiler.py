@@ -0,0 +1,132 @@
+import numpy as np
+import sklearn
+
+# scikit-learn < 1.4 stores class counts in tree_.value and normalizes them in
+# predict_proba; newer versions store the class fractions directly
+_NORMALIZE_CLASS_COUNTS = tuple(int(part) for part in sklearn.__version__.split('.')[:2]) < (1, 4)
+
+def compile_forest(model):
+    """
+    Flatten a fitted RandomForestClassifier/Regressor into contiguous node arrays.
+    
+    All trees are concatenated into one node table. Leaves point to themselves
+    with an infinite threshold, so a fixed number of traversal steps
+    (max_depth) lands every sample on its leaf without branching.
+    
+    Args:
+        model: Fitted RandomForestClassifier or RandomForestRegressor
+    
+    Returns:
+        dict: Plain NumPy arrays (feature, threshold, left, right, missing_left,
+        value, roots) plus max_depth, n_features, kind and classes
+    """
+    is_classifier = hasattr(model, 'classes_')
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    
+    node_counts = np.array([tree.node_count for tree in trees])
+    roots = np.concatenate([[0], np.cumsum(node_counts)[:-1]]).astype(np.int64)
+    
+    features, thresholds, lefts, rights, missing_lefts, values = [], [], [], [], [], []
+    for tree, offset in zip(trees, roots):
+        is_leaf = tree.children_left == -1
+        own_index = np.arange(tree.node_count, dtype=np.int64) + offset
+        
+        features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        lefts.append(np.where(is_leaf, own_index, tree.children_left + offset))
+        rights.append(np.where(is_leaf, own_index, tree.children_right + offset))
+        
+        missing_go_to_left = getattr(tree, 'missing_go_to_left', None)
+        if missing_go_to_left is None:
+            # Before missing-value support, NaN failed the <= test and went right
+            missing_go_to_left = np.zeros(tree.node_count, dtype=bool)
+        missing_lefts.append(np.asarray(missing_go_to_left, dtype=bool))
+        
+        if is_classifier:
+            value = tree.value[:, 0, :].astype(np.float64)
+            if _NORMALIZE_CLASS_COUNTS:
+                normalizer = value.sum(axis=1)[:, np.newaxis]
+                normalizer[normalizer == 0.0] = 1.0
+                value = value / normalizer
+        else:
+            value = tree.value[:, 0, :1].astype(np.float64)
+        values.append(value)
+    
+    return {
+        'kind': 'classifier' if is_classifier else 'regressor',
+        'classes': np.asarray(model.classes_) if is_classifier else None,
+        'n_features': model.n_features_in_,
+        'max_depth': max(tree.max_depth for tree in trees),
+        'roots': roots,
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'missing_left': np.concatenate(missing_lefts),
+        'value': np.ascontiguousarray(np.concatenate(values))
+    }
+
+def forest_leaves(compiled, X):
+    """
+    Find the leaf every sample reaches in every tree.
+    
+    Args:
+        compiled (dict): Output of compile_forest
+        X: Array of shape (n_samples, n_features)
+    
+    Returns:
+        np.ndarray: Node indices of shape (n_samples, n_trees)
+    """
+    # sklearn compares float32 inputs against float64 thresholds
+    X = np.asarray(X, dtype=np.float32).astype(np.float64)
+    rows = np.arange(X.shape[0])[:, np.newaxis]
+    
+    node = np.broadcast_to(compiled['roots'], (X.shape[0], len(compiled['roots']))).copy()
+    for _ in range(compiled['max_depth']):
+        x = X[rows, compiled['feature'][node]]
+        go_left = np.where(np.isnan(x), compiled['missing_left'][node], x <= compiled['threshold'][node])
+        node = np.where(go_left, compiled['left'][node], compiled['right'][node])
+    return node
+
+def tree_values(compiled, X):
+    """
+    Output of every tree for every sample.
+    
+    Returns:
+        np.ndarray: Leaf values of shape (n_samples, n_trees, n_outputs), class
+        probabilities for a classifier and the prediction in column 0 for a
+        regressor; their mean over the trees is predict_forest
+    """
+    return compiled['value'][forest_leaves(compiled, X)]
+
+def predict_forest(compiled, X):
+    """
+    Score a batch across all trees at once.
+    
+    Per-tree outputs are accumulated in tree order and then divided by the
+    number of trees, exactly as scikit-learn does, so results match
+    predict_proba/predict bit for bit.
+    
+    Returns:
+        np.ndarray: Class probabilities of shape (n_samples, n_classes) for a
+        classifier, predictions of shape (n_samples,) for a regressor
+    """
+    leaves = forest_leaves(compiled, X)
+    value = compiled['value']
+    
+    out = np.zeros((leaves.shape[0], value.shape[1]))
+    for t in range(leaves.shape[1]):
+        out += value[leaves[:, t]]
+    out /= leaves.shape[1]
+    
+    if compiled['kind'] == 'regressor':
+        return out[:, 0]
+    return out
+
+def matches_sklearn(compiled, model, X):
+    """Return True if the compiled forest reproduces the model's outputs exactly on X."""
+    if compiled['kind'] == 'classifier':
+        expected = model.predict_proba(X)
+    else:
+        expected = model.predict(X)
+    return np.array_equal(predict_forest(compiled, X), expected)
@@ -1,40 +1,347 @@
 import pandas as pd
 import numpy as np
+import os
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from surgery_scheduler import predict_surgery
+
+class SlotCalendar:
+    """
+    Occupancy of every slot of every OR over a number of days.
+    
+    occupied is a boolean (day, OR, slot) array. Next to it, each OR/day keeps
+    its free time as sorted [start, end) slot intervals, so windows of a given
+    length are listed without scanning occupied slots.
+    
+    Staff members (any hashable key) get a (day, slot) timeline of their own,
+    booked together with the OR. Each timeline keeps its cumulative booked
+    slot counts, so whether a member is free for a window is one subtraction,
+    whatever the number of cases or staff.
+    
+    pacu is the PACU occupancy profile: patients in recovery per (day, slot),
+    extended past the end of the day as far as the stays booked in it run.
+    Placing a case adds one over its recovery slots; like the staff
+    timelines, the slots where every bed is taken are kept as cumulative
+    counts for constant-time checks.
+    """
+    def __init__(self, num_days, operating_rooms, slots_per_day, pacu_beds=None):
+        self.occupied = np.zeros((num_days, operating_rooms, slots_per_day), dtype=bool)
+        self._starts = [[[0] for _ in range(operating_rooms)] for _ in range(num_days)]
+        self._ends = [[[slots_per_day] for _ in range(operating_rooms)] for _ in range(num_days)]
+        self.staff_busy = {}
+        self._staff_cumulative = {}
+        self.pacu_beds = pacu_beds
+        self.pacu = np.zeros((num_days, slots_per_day), dtype=np.int64)
+        self._pacu_cumulative = None
+    
+    def _cumulative(self, member):
+        """Booked slots of a staff member before every slot boundary, shape (day, slot + 1)."""
+        cumulative = self._staff_cumulative.get(member)
+        if cumulative is None:
+            busy = self.staff_busy[member]
+            cumulative = np.zeros((busy.shape[0], busy.shape[1] + 1), dtype=np.int64)
+            np.cumsum(busy, axis=1, out=cumulative[:, 1:])
+            self._staff_cumulative[member] = cumulative
+        return cumulative
+    
+    def staff_free(self, day, slot, slots_needed, staff):
+        """Return True if no member of staff is booked in slots_needed slots starting at slot."""
+        for member in staff:
+            if member in self.staff_busy:
+                cumulative = self._cumulative(member)
+                if cumulative[day, slot + slots_needed] != cumulative[day, slot]:
+                    return False
+        return True
+    
+    def _full_pacu(self):
+        """Slots with every PACU bed taken before every slot boundary, shape (day, slot + 1)."""
+        if self._pacu_cumulative is None:
+            self._pacu_cumulative = np.zeros((self.pacu.shape[0], self.pacu.shape[1] + 1), dtype=np.int64)
+            np.cumsum(self.pacu >= self.pacu_beds, axis=1, out=self._pacu_cumulative[:, 1:])
+        return self._pacu_cumulative
+    
+    def pacu_free(self, day, slot, recovery):
+        """
+        Return True if a case starting at slot finds a PACU bed for its recovery.
+        
+        Args:
+            recovery: (first, end) recovery slots relative to the start slot,
+                or None for a case that needs no bed
+        """
+        if recovery is None or self.pacu_beds is None:
+            return True
+        full = self._full_pacu()
+        first, end = self._pacu_span(slot, recovery)
+        return full[day, end] == full[day, first]
+    
+    def _pacu_span(self, slots, recovery):
+        """Recovery slots (first, end) of stays starting at slots, clipped to the end of the profile."""
+        width = self.pacu.shape[1]
+        return np.minimum(slots + recovery[0], width), np.minimum(slots + recovery[1], width)
+    
+    def _window_mask(self, days, slots, slots_needed, staff, recovery):
+        """Which of the windows (days, slots) have every member of staff free and a PACU bed."""
+        free = np.ones(len(slots), dtype=bool)
+        for member in staff:
+            if member in self.staff_busy:
+                cumulative = self._cumulative(member)
+                free &= cumulative[days, slots + slots_needed] == cumulative[days, slots]
+        if recovery is not None and self.pacu_beds is not None:
+            full = self._full_pacu()
+            first, end = self._pacu_span(slots, recovery)
+            free &= full[days, end] == full[days, first]
+        return free
+    
+    def _book_staff(self, day, slot, slots_needed, staff, busy):
+        for member in staff:
+            if member not in self.staff_busy:
+                self.staff_busy[member] = np.zeros((self.occupied.shape[0], self.occupied.shape[2]), dtype=bool)
+            self.staff_busy[member][day, slot:slot + slots_needed] = busy
+            self._staff_cumulative.pop(member, None)
+    
+    def _book_pacu(self, day, slot, recovery, patients):
+        if recovery is not None:
+            if slot + recovery[1] > self.pacu.shape[1]:
+                self.pacu = np.pad(self.pacu, ((0, 0), (0, slot + recovery[1] - self.pacu.shape[1])))
+            self.pacu[day, slot + recovery[0]:slot + recovery[1]] += patients
+            self._pacu_cumulative = None
+    
+    def free_windows(self, slots_needed, day_indices, staff=(), recovery=None):
+        """
+        List every start slot where slots_needed consecutive slots are free.
+        
+        Args:
+            slots_needed (int): Length of the window in slots
+            day_indices: Days to search
+            staff: Staff members who must also be free for the whole window
+            recovery: (first, end) recovery slots relative to the start that
+                need a PACU bed, or None
+        
+        Returns:
+            tuple: Arrays (or_idx, day, slot), ordered OR by OR and then in time order
+        """
+        or_indices, days, starts, counts = [], [], [], []
+        for or_idx in range(self.occupied.shape[1]):
+            for day in day_indices:
+                for start, end in zip(self._starts[day][or_idx], self._ends[day][or_idx]):
+                    if end - start >= slots_needed:
+                        or_indices.append(or_idx)
+                        days.append(day)
+                        starts.append(start)
+                        counts.append(end - start - slots_needed + 1)
+        
+        # Expand each long-enough interval into its window start slots
+        counts = np.array(counts, dtype=np.int64)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        windows = (np.repeat(np.array(or_indices, dtype=np.int64), counts),
+                   np.repeat(np.array(days, dtype=np.int64), counts),
+                   np.repeat(np.array(starts, dtype=np.int64), counts) + offsets)
+        if staff or recovery is not None:
+            keep = self._window_mask(windows[1], windows[2], slots_needed, staff, recovery)
+            windows = tuple(array[keep] for array in windows)
+        return windows
+    
+    def reserve(self, day, or_idx, slot, slots_needed, staff=(), recovery=None):
+        """
+        Mark slots_needed slots starting at slot as occupied, for the OR and for
+        staff, and take a PACU bed for the recovery slots.
+        
+        Raises:
+            ValueError: If any of the slots is already occupied, a member of
+                staff is booked elsewhere during them, or no PACU bed is free
+        """
+        starts, ends = self._starts[day][or_idx], self._ends[day][or_idx]
+        i = bisect_right(starts, slot) - 1
+        if i < 0 or slot + slots_needed > ends[i]:
+            raise ValueError(f"Slots {slot}-{slot + slots_needed - 1} of OR {or_idx + 1} "
+                             f"on day {day} are not free")
+        if not self.staff_free(day, slot, slots_needed, staff):
+            raise ValueError(f"Staff of slots {slot}-{slot + slots_needed - 1} on day {day} "
+                             f"are booked in another OR")
+        if not self.pacu_free(day, slot, recovery):
+            raise ValueError(f"No PACU bed is free after slot {slot} on day {day}")
+        
+        # Split the free interval around the reserved slots
+        remaining = [(start, end) for start, end in ((starts[i], slot), (slot + slots_needed, ends[i]))
+                     if end > start]
+        starts[i:i + 1] = [start for start, _ in remaining]
+        ends[i:i + 1] = [end for _, end in remaining]
+        self.occupied[day, or_idx, slot:slot + slots_needed] = True
+        self._book_staff(day, slot, slots_needed, staff, True)
+        self._book_pacu(day, slot, recovery, 1)
+    
+    def release(self, day, or_idx, slot, slots_needed, staff=(), recovery=None):
+        """
+        Free slots_needed slots starting at slot again, for the OR, for staff
+        and in the PACU.
+        
+        Raises:
+            ValueError: If any of the slots is not occupied
+        """
+        if not self.occupied[day, or_idx, slot:slot + slots_needed].all():
+            raise ValueError(f"Slots {slot}-{slot + slots_needed - 1} of OR {or_idx + 1} "
+                             f"on day {day} are not occupied")
+        
+        # Merge with the free intervals that end or start right at the released slots
+        starts, ends = self._starts[day][or_idx], self._ends[day][or_idx]
+        i = bisect_right(starts, slot)
+        lo, hi, start, end = i, i, slot, slot + slots_needed
+        if i > 0 and ends[i - 1] == start:
+            lo, start = i - 1, starts[i - 1]
+        if i < len(starts) and starts[i] == end:
+            hi, end = i + 1, ends[i]
+        starts[lo:hi] = [start]
+        ends[lo:hi] = [end]
+        self.occupied[day, or_idx, slot:slot + slots_needed] = False
+        self._book_staff(day, slot, slots_needed, staff, False)
+        self._book_pacu(day, slot, recovery, -1)
+    
+    def is_free(self, day, or_idx, slot, slots_needed, staff=(), recovery=None):
+        """Return True if slots_needed slots starting at slot are all free, with staff and a PACU bed."""
+        if slot < 0:
+            return False
+        i = bisect_right(self._starts[day][or_idx], slot) - 1
+        return (i >= 0 and slot + slots_needed <= self._ends[day][or_idx][i] and
+                self.staff_free(day, slot, slots_needed, staff) and self.pacu_free(day, slot, recovery))
+    
+    def free_starts(self, day, or_idx, slots_needed, staff=(), recovery=None):
+        """Start slots of every free window of slots_needed slots in one OR on one day."""
+        starts = np.concatenate([np.arange(start, end - slots_needed + 1, dtype=np.int64)
+                                 for start, end in zip(self._starts[day][or_idx], self._ends[day][or_idx])]
+                                + [np.zeros(0, dtype=np.int64)])
+        if staff or recovery is not None:
+            starts = starts[self._window_mask(np.full(len(starts), day), starts, slots_needed, staff, recovery)]
+        return starts
 
 class SurgeryScheduleOptimizer:
-    def __init__(self):
+    def __init__(self, predictor=None):
+        """
+        Args:
+            predictor: Function with the signature of predict_surgeries, used in
+                its place (e.g. a service's own loaded model); defaults to
+                predict_surgeries
+        """
+        if predictor is None:
+            # Imported here so the optimizer can be used without loading the models
+            from surgery_scheduler import predict_surgeries as predictor
+        self.predictor = predictor
+        
         # Operating hours
         self.start_hour = 8  # 8 AM
         self.end_hour = 17   # 5 PM
         self.operating_rooms = 3  # Number of available ORs
         
+        # Length of a calendar slot in minutes (5, 10, 15 or 30); cases are
+        # rounded up to whole slots, so finer slots waste less OR time
+        self.slot_minutes = 30
+        
         # Buffer times (in minutes)
         self.cleanup_time = 30
         self.emergency_buffer = 60  # Emergency buffer at end of day
         
+        # Objective value of scheduling a case at all, on top of its slot score,
+        # so the exact solver never leaves a case out to gain score elsewhere
+        self.placement_reward = 1000
+        
+        # Columns naming the staff of a case; nobody is booked in two ORs at once
+        self.staff_roles = ('Surgeon', 'Anesthesiologist', 'Nurse')
+        
+        # Recovery beds, None to schedule without a PACU limit; a patient stays
+        # recovery_time minutes unless the case gives its 'Recovery Time (min)'
+        self.pacu_beds = None
+        self.recovery_time = 60
+        
+        # Minutes a patient waits for a bed when the case has no 'PACU Delay (min)'
+        # but its 'PACU Bed Ready (Y/N)' is N (the mean wait of such historical cases)
+        self.pacu_wait = 20
+        
+        # Counters from the last create_weekly_schedule call
+        self._reset_stats()
+    
+    def _reset_stats(self):
+        """Clear the counters; _predict counts every predictor call and the rows it scored."""
+        self.stats = {'predictor_calls': 0, 'predictions': 0, 'rows_per_call': [], 'scored_slots': 0}
+    
+    def _predict(self, surgeries):
+        """Run the predictor on a batch of surgeries, counting the call and the rows it scored."""
+        predictions = self.predictor(surgeries)
+        self.stats['predictor_calls'] += 1
+        self.stats['predictions'] += len(predictions)
+        self.stats['rows_per_call'].append(len(predictions))
+        return predictions
+    
     def _get_available_slots(self, start_date, num_days=5):
-        """Generate available time slots for the week."""
-        slots = []
+        """
+        Generate the slot calendar for num_days days from start_date.
+        
+        Returns:
+            tuple: (days, calendar) where days holds the datetime of each
+            weekday in those days and calendar is an empty SlotCalendar of
+            slot_minutes-minute slots
+        
+        Raises:
+            ValueError: If slot_minutes does not divide an hour
+        """
+        if self.slot_minutes <= 0 or 60 % self.slot_minutes:
+            raise ValueError(f"Slots of {self.slot_minutes} minutes do not divide an hour")
+        
+        days = []
         current_date = start_date
         
         for day in range(num_days):  # Monday to Friday
             if current_date.weekday() < 5:  # Weekdays only
-                for hour in range(self.start_hour, self.end_hour):
-                    for minute in [0, 30]:  # 30-minute slots
-                        for or_num in range(1, self.operating_rooms + 1):
-                            slot_time = current_date.replace(hour=hour, minute=minute)
-                            slots.append({
-                                'datetime': slot_time,
-                                'OR': or_num,
-                                'available': True
-                            })
+                days.append(current_date)
             current_date += timedelta(days=1)
-        return pd.DataFrame(slots)
-
-    def _calculate_surgery_score(self, surgery, slot_datetime):
-        """Calculate priority score for a surgery."""
+        
+        slots_per_day = (self.end_hour - self.start_hour) * 60 // self.slot_minutes
+        return days, SlotCalendar(len(days), self.operating_rooms, slots_per_day, self.pacu_beds)
+    
+    def _slot_datetime(self, days, day, slot):
+        """Start time of a slot on one day of the calendar."""
+        minutes = int(slot) * self.slot_minutes
+        return days[day].replace(hour=self.start_hour + minutes // 60, minute=minutes % 60)
+    
+    def _slot_times(self, days, slots_per_day):
+        """Start time of every slot as datetime64, shape (day, slot)."""
+        day_starts = np.array([self._slot_datetime(days, day, 0) for day in range(len(days))],
+                              dtype='datetime64[us]')
+        return day_starts[:, np.newaxis] + np.arange(slots_per_day) * np.timedelta64(self.slot_minutes, 'm')
+    
+    def _calculate_surgery_score(self, surgery, slot_datetime, prediction=None):
+        """
+        Calculate priority score for a surgery.
+        
+        The rules live in _score_slots; this scores the one slot through it.
+        
+        Args:
+            surgery: Dictionary with the surgery information
+            slot_datetime: Candidate start time
+            prediction: The surgery's prediction; computed here if
+                not given, but it does not depend on the slot, so callers
+                scoring many slots should pass it in
+        """
+        if prediction is None:
+            prediction = self._predict([surgery]).iloc[0]
+        slot_times = np.array([pd.Timestamp(slot_datetime).to_datetime64()], dtype='datetime64[us]')
+        return float(self._score_slots(surgery, prediction, slot_times)[0])
+    
+    def _score_slots(self, surgery, prediction, slot_times):
+        """
+        Score one surgery against many start times at once.
+        
+        These are the scheduling rules, the only copy of them;
+        _calculate_surgery_score scores a single slot with them. The
+        slot-independent terms are computed once.
+        
+        Args:
+            surgery: Dictionary with the surgery information
+            prediction: The surgery's predict_surgery result
+            slot_times: datetime64 array of candidate start times, any shape
+        
+        Returns:
+            np.ndarray: Scores with the shape of slot_times
+        """
         score = 0
         
         # Priority based on patient age
@@ -42,168 +349,810 @@ class SurgeryScheduleOptimizer:
             score += 20
         elif surgery['Patient Age'] > 60:
             score += 15
-            
+        
         # Priority based on surgery complexity
         complexity = (surgery['Pre-op Prep Time (min)'] + 
                      surgery['Anesthesia Time (min)'] + 
                      surgery['Positioning Time (min)']) / 3
         if complexity > 60:
             score += 15
-            
+        
+        # Penalty for predicted delays
+        if prediction['Predicted_Delay'] == 'High Risk':
+            score -= 20
+        
+        scores = np.full(slot_times.shape, score, dtype=np.float64)
+        slot_dates = slot_times.astype('datetime64[D]')
+        slot_hours = (slot_times - slot_dates).astype('timedelta64[h]').astype(np.int64)
+        
         # Preferred time of day (morning slots for complex surgeries)
-        if complexity > 45 and slot_datetime.hour < 11:
-            score += 10
-            
+        if complexity > 45:
+            scores += np.where(slot_hours < 11, 10, 0)
+        
         # Preference for original scheduled time
         scheduled_start = pd.to_datetime(surgery['Scheduled Start'])
-        time_diff = abs((slot_datetime - scheduled_start).total_seconds() / 3600)  # hours
-        if time_diff < 1:  # Within 1 hour of preferred time
-            score += 50
-        elif time_diff < 2:  # Within 2 hours
-            score += 30
-        elif time_diff < 4:  # Within 4 hours
-            score += 10
-            
+        time_diff = np.abs((slot_times - np.datetime64(scheduled_start, 'us')) / np.timedelta64(1, 's') / 3600)  # hours
+        scores += np.select([time_diff < 1, time_diff < 2, time_diff < 4], [50, 30, 10], 0)
+        
         # Preference for same day
-        if slot_datetime.date() == scheduled_start.date():
-            score += 40
-            
+        scores += np.where(slot_dates == np.datetime64(scheduled_start.date()), 40, 0)
+        
         # Early morning bonus for elderly patients
-        if surgery['Patient Age'] > 65 and slot_datetime.hour < 10:
-            score += 15
-            
-        # Penalty for predicted delays
-        prediction = predict_surgery(surgery)
-        if prediction['Predicted_Delay'] == 'High Risk':
-            score -= 20
-            
-        return score
-
-    def create_weekly_schedule(self, surgeries_list, start_date):
+        if surgery['Patient Age'] > 65:
+            scores += np.where(slot_hours < 10, 15, 0)
+        
+        return scores
+    
+    def create_weekly_schedule(self, surgeries_list, start_date, improve_iterations=0,
+                               improve_time=None, seed=42, order=None):
         """
         Create an optimized weekly schedule for surgeries.
         
         Args:
             surgeries_list: List of dictionaries containing surgery information
             start_date: datetime object for the start of the week
+            improve_iterations (int): Local-search moves to try after the
+                greedy pass (0 for none, or unlimited if improve_time is set)
+            improve_time (float, optional): Time budget for the local search in seconds
+            seed (int): Random seed for the local search
+            order (list, optional): Indices into surgeries_list in the order the
+                surgeries are placed; by default the most complex and oldest
+                patients go first
         
         Returns:
-            DataFrame with the optimized schedule
+            DataFrame with the optimized schedule, indexed by position in
+            surgeries_list; attrs['total_score'] is the sum of the scheduled
+            surgeries' scores and attrs['local_search'] reports the
+            improvement phase, if it ran
         """
-        # Initialize available slots
-        available_slots = self._get_available_slots(start_date)
-        scheduled_surgeries = []
+        surgeries_df, predictions = self._prepare_surgeries(surgeries_list)
+        days, calendar = self._get_available_slots(start_date)
+        if order is not None:
+            order = surgeries_df.index.get_indexer(order)
+        placements = self._place_greedily(surgeries_df, predictions, days, calendar, order)
         
-        # Sort surgeries by complexity and age
-        surgeries_df = pd.DataFrame(surgeries_list)
-        surgeries_df['complexity'] = (surgeries_df['Pre-op Prep Time (min)'] + 
-                                    surgeries_df['Anesthesia Time (min)'] + 
-                                    surgeries_df['Positioning Time (min)']) / 3
-        surgeries_df = surgeries_df.sort_values(['complexity', 'Patient Age'], 
-                                              ascending=[False, False])
+        if improve_iterations or improve_time:
+            placements = self._improve_schedule(
+                surgeries_df, predictions, days, calendar, placements,
+                improve_iterations, improve_time, seed
+            )
         
-        # Schedule each surgery
-        for _, surgery in surgeries_df.iterrows():
-            surgery_dict = surgery.to_dict()
-            best_slot = None
-            best_score = -float('inf')
+        schedule_df = self._build_schedule(surgeries_df, predictions, days, placements)
+        if 'local_search' in self.stats:
+            schedule_df.attrs['local_search'] = self.stats['local_search']
+        return schedule_df
+    
+    def create_rolling_schedule(self, surgeries_list, start_date, weeks=None, lookahead_weeks=1,
+                                improve_iterations=0, seed=42):
+        """
+        Schedule a backlog week by week, yielding each week as soon as it is final.
+        
+        Every window covers the week being committed plus lookahead_weeks more.
+        Surgeries join the window once their requested date falls inside it,
+        and surgeries requested before start_date join the first window. Only
+        the first week of a window is committed. Its schedule is frozen and
+        yielded, and everything placed in the lookahead or left unscheduled
+        goes back to the backlog for the next window. Predictions are made
+        once for the whole backlog.
+        
+        Args:
+            surgeries_list: List of dictionaries containing surgery information
+            start_date: datetime object for the start of the first week
+            weeks (int, optional): Number of weeks to schedule; by default runs
+                until the backlog is empty or nothing left in it fits
+            lookahead_weeks (int): Weeks planned past each committed week
+            improve_iterations (int): Local-search moves per window
+            seed (int): Random seed for the local search
+        
+        Yields:
+            DataFrame: One week's schedule, indexed by position in
+            surgeries_list, as create_weekly_schedule returns it;
+            attrs['week_start'] is the week's start date and attrs['backlog']
+            the number of surgeries still waiting after it
+        """
+        surgeries_df, predictions = self._prepare_surgeries(surgeries_list)
+        requested_dates = surgeries_df['Scheduled Start'].dt.normalize()
+        
+        week = 0
+        while not surgeries_df.empty and (weeks is None or week < weeks):
+            week_start = start_date + timedelta(weeks=week)
+            window_end = week_start + timedelta(weeks=1 + lookahead_weeks)
+            released = (requested_dates < pd.Timestamp(window_end.date())).to_numpy()
+            window_df = surgeries_df[released]
             
-            # Use the actual duration from training data if available
-            if 'Total OR Time (min)' in surgery_dict:
-                total_time_needed = surgery_dict['Total OR Time (min)'] + self.cleanup_time
-            else:
-                prediction = predict_surgery(surgery_dict)
-                total_time_needed = prediction['Predicted_Duration'] + self.cleanup_time
+            days, calendar = self._get_available_slots(week_start, num_days=7 * (1 + lookahead_weeks))
+            placements = self._place_greedily(window_df, predictions, days, calendar)
+            if improve_iterations:
+                placements = self._improve_schedule(
+                    window_df, predictions, days, calendar, placements, improve_iterations, seed=seed + week
+                )
             
-            slots_needed = int(np.ceil(total_time_needed / 30))  # 30-minute slots
+            # Freeze the first week; the lookahead is planned again next window
+            week_days = sum(day < week_start + timedelta(weeks=1) for day in days)
+            committed = {position: placement for position, placement in placements.items()
+                         if placement[0] < week_days}
+            schedule_df = self._build_schedule(window_df, predictions, days[:week_days], committed)
+            
+            scheduled = window_df.index[list(committed)]
+            keep = ~surgeries_df.index.isin(scheduled)
+            surgeries_df, requested_dates = surgeries_df[keep], requested_dates[keep]
+            for index in scheduled:
+                del predictions[index]
+            
+            schedule_df.attrs['week_start'] = week_start
+            schedule_df.attrs['backlog'] = len(surgeries_df)
+            yield schedule_df
+            week += 1
+            
+            # Every weekly calendar is empty, so a week that placed nothing with
+            # the whole backlog released would repeat forever
+            if weeks is None and not committed and released.all():
+                return
+    
+    def _place_greedily(self, surgeries_df, predictions, days, calendar, order=None,
+                        preferred_only=False):
+        """
+        Give each surgery, in order, its best free slot in the calendar.
+        
+        Args:
+            order: Positions in surgeries_df in the order to place them
+                (defaults to the order of surgeries_df)
+            preferred_only (bool): Leave surgeries that do not fit on their
+                preferred day unscheduled instead of trying the other days
+        
+        Returns:
+            dict: (day, OR index, start slot, score) for every placed surgery,
+            keyed by its position in surgeries_df, in placement order
+        """
+        slot_times = self._slot_times(days, calendar.occupied.shape[2])
+        placements = {}
+        
+        # Schedule each surgery
+        for position in (range(len(surgeries_df)) if order is None else order):
+            index, surgery = surgeries_df.index[position], surgeries_df.iloc[position]
+            surgery_dict = surgery.to_dict()
+            prediction = predictions[index]
+            total_time_needed, slots_needed = self._time_needed(surgery_dict, prediction)
+            staff, recovery = self._staff(surgery_dict), self._recovery(surgery_dict, total_time_needed)
             
             # Try to schedule on preferred day first
-            preferred_start = pd.to_datetime(surgery_dict['Scheduled Start'])
-            preferred_day_slots = available_slots[
-                available_slots['datetime'].dt.date == preferred_start.date()
-            ]
+            preferred_start = surgery_dict['Scheduled Start']
+            preferred_days = [day for day, date in enumerate(days)
+                              if date.date() == preferred_start.date()]
             
             # First try slots on preferred day
             best_slot, best_score = self._find_best_slot(
-                surgery_dict, preferred_day_slots, slots_needed
+                surgery_dict, prediction, slot_times,
+                calendar.free_windows(slots_needed, preferred_days, staff, recovery)
             )
             
             # If no slot found on preferred day, try other days
-            if best_slot is None:
+            if best_slot is None and not preferred_only:
                 best_slot, best_score = self._find_best_slot(
-                    surgery_dict, available_slots, slots_needed
+                    surgery_dict, prediction, slot_times,
+                    calendar.free_windows(slots_needed, range(len(days)), staff, recovery)
                 )
             
             # Schedule the surgery if a slot was found
             if best_slot is not None:
-                slot_idx = available_slots[
-                    (available_slots['datetime'] == best_slot['datetime']) & 
-                    (available_slots['OR'] == best_slot['OR'])
-                ].index[0]
+                day, or_idx, slot = best_slot
                 
                 # Mark slots as unavailable
-                available_slots.loc[slot_idx:slot_idx + slots_needed - 1, 
-                                 'available'] = False
+                calendar.reserve(day, or_idx, slot, slots_needed, staff, recovery)
+                placements[position] = (day, or_idx, slot, best_score)
                 
-                # Get delay prediction
-                prediction = predict_surgery(surgery_dict)
+        return placements
+        
+    def _improve_schedule(self, surgeries_df, predictions, days, calendar, placements,
+                          iterations=0, time_budget=None, seed=42):
+        """
+        Improve a schedule with simulated annealing.
+        
+        Each step tries one neighbourhood move: move a case to a random free
+        window, shift it one slot, swap the slots of two cases, or insert an
+        unscheduled case. Every case's score for every start slot is computed
+        once up front, so a move is evaluated from the score change of the
+        cases it touches instead of re-scoring the week. The objective is the
+        one the exact solver maximizes: placement_reward per scheduled case
+        plus its score.
+        
+        Args:
+            calendar: SlotCalendar holding the placements; updated in place
+            placements: Output of _place_greedily
+            iterations (int): Moves to try (0 for no limit)
+            time_budget (float, optional): Seconds to run for
+            seed (int): Random seed
+        
+        Returns:
+            dict: The best placements found; self.stats['local_search'] has the
+            move counts, moves per second and the objective before and after
+        """
+        rng = np.random.default_rng(seed)
+        slot_times = self._slot_times(days, calendar.occupied.shape[2])
+        slots_per_day = calendar.occupied.shape[2]
+        surgeries = [surgery.to_dict() for _, surgery in surgeries_df.iterrows()]
+        case_predictions = [predictions[index] for index in surgeries_df.index]
+        
+        # Score of every case at every (day, start slot), the basis of all deltas
+        scores = [self._score_slots(surgery, prediction, slot_times)
+                  for surgery, prediction in zip(surgeries, case_predictions)]
+        time_needed = [self._time_needed(surgery, prediction)
+                       for surgery, prediction in zip(surgeries, case_predictions)]
+        slots_needed = [slots for _, slots in time_needed]
+        # Everything the calendar checks for a case: its slots, its staff and its PACU stay
+        needs = [(slots, self._staff(surgery), self._recovery(surgery, total_time_needed))
+                 for surgery, (total_time_needed, slots) in zip(surgeries, time_needed)]
+        
+        placements = dict(placements)
+        initial_cases = len(placements)
+        unscheduled = [case for case in range(len(surgeries))
+                       if case not in placements and slots_needed[case] <= slots_per_day]
+        
+        initial = current = best = (sum(placement[3] for placement in placements.values()) +
+                                    self.placement_reward * len(placements))
+        best_placements = dict(placements)
+        accepted = {'insert': 0, 'move': 0, 'shift': 0, 'swap': 0}
+        
+        started = time.perf_counter()
+        step = 0
+        while len(placements) + len(unscheduled) > 0:
+            elapsed = time.perf_counter() - started
+            if iterations and step >= iterations:
+                break
+            if time_budget is not None and elapsed >= time_budget:
+                break
+            
+            # Cool down linearly over whichever budget runs out first
+            progress = max(step / iterations if iterations else 0.0,
+                           elapsed / time_budget if time_budget else 0.0)
+            temperature = 10.0 * (1.0 - progress) + 0.1
+            step += 1
+            
+            scheduled = list(placements)
+            if unscheduled and (not scheduled or rng.random() < 0.3):
+                kind = 'insert'
+            elif len(scheduled) >= 2:
+                kind = ('move', 'shift', 'swap')[rng.integers(3)]
+            else:
+                kind = ('move', 'shift')[rng.integers(2)]
+            
+            if kind == 'insert':
+                # Put an unscheduled case in the best window of a random OR and day, if there is one
+                k = int(rng.integers(len(unscheduled)))
+                case = unscheduled[k]
+                day, or_idx = int(rng.integers(len(days))), int(rng.integers(self.operating_rooms))
+                starts = calendar.free_starts(day, or_idx, *needs[case])
+                if len(starts) == 0:
+                    continue
+                slot = int(starts[np.argmax(scores[case][day, starts])])
+                calendar.reserve(day, or_idx, slot, *needs[case])
+                placements[case] = (day, or_idx, slot, float(scores[case][day, slot]))
+                unscheduled[k] = unscheduled[-1]
+                unscheduled.pop()
+                delta = self.placement_reward + placements[case][3]
+            
+            elif kind in ('move', 'shift'):
+                case = scheduled[rng.integers(len(scheduled))]
+                old_day, old_or, old_slot, old_score = placements[case]
+                calendar.release(old_day, old_or, old_slot, *needs[case])
+                
+                if kind == 'move':
+                    day, or_idx = int(rng.integers(len(days))), int(rng.integers(self.operating_rooms))
+                    starts = calendar.free_starts(day, or_idx, *needs[case])
+                    slot = int(rng.choice(starts)) if len(starts) else None
+                else:
+                    day, or_idx = old_day, old_or
+                    slot = old_slot + (1 if rng.random() < 0.5 else -1)
+                    if not calendar.is_free(day, or_idx, slot, *needs[case]):
+                        slot = None
+                
+                delta = float(scores[case][day, slot]) - old_score if slot is not None else None
+                if delta is None or not (delta >= 0 or rng.random() < np.exp(delta / temperature)):
+                    calendar.reserve(old_day, old_or, old_slot, *needs[case])
+                    continue
+                calendar.reserve(day, or_idx, slot, *needs[case])
+                placements[case] = (day, or_idx, slot, float(scores[case][day, slot]))
+            
+            else:
+                # Exchange the start times and ORs of two cases
+                first, second = rng.choice(scheduled, size=2, replace=False)
+                day_a, or_a, slot_a, score_a = placements[first]
+                day_b, or_b, slot_b, score_b = placements[second]
+                calendar.release(day_a, or_a, slot_a, *needs[first])
+                calendar.release(day_b, or_b, slot_b, *needs[second])
                 
-                # Add to scheduled surgeries
-                scheduled_surgeries.append({
-                    'Surgery Type': surgery['Surgery Type'],
-                    'Patient Age': surgery['Patient Age'],
-                    'Surgeon': surgery['Surgeon'],
-                    'Scheduled Date': best_slot['datetime'].date(),
-                    'Scheduled Time': best_slot['datetime'].strftime('%H:%M'),
-                    'Operating Room': best_slot['OR'],
-                    'Estimated Duration': total_time_needed - self.cleanup_time,
-                    'Delay Risk': prediction['Predicted_Delay'],
-                    'Original Time': pd.to_datetime(surgery['Scheduled Start']).strftime('%Y-%m-%d %H:%M')
-                })
-        
-        # Create final schedule
+                delta = None
+                if calendar.is_free(day_b, or_b, slot_b, *needs[first]):
+                    calendar.reserve(day_b, or_b, slot_b, *needs[first])
+                    if calendar.is_free(day_a, or_a, slot_a, *needs[second]):
+                        delta = (float(scores[first][day_b, slot_b] + scores[second][day_a, slot_a]) -
+                                 score_a - score_b)
+                    if delta is None or not (delta >= 0 or rng.random() < np.exp(delta / temperature)):
+                        calendar.release(day_b, or_b, slot_b, *needs[first])
+                        delta = None
+                
+                if delta is None:
+                    calendar.reserve(day_a, or_a, slot_a, *needs[first])
+                    calendar.reserve(day_b, or_b, slot_b, *needs[second])
+                    continue
+                calendar.reserve(day_a, or_a, slot_a, *needs[second])
+                placements[first] = (day_b, or_b, slot_b, float(scores[first][day_b, slot_b]))
+                placements[second] = (day_a, or_a, slot_a, float(scores[second][day_a, slot_a]))
+            
+            accepted[kind] += 1
+            current += delta
+            if current > best:
+                best = current
+                best_placements = dict(placements)
+        
+        elapsed = time.perf_counter() - started
+        self.stats['local_search'] = {
+            'iterations': step,
+            'accepted': accepted,
+            'seconds': elapsed,
+            'moves_per_second': step / elapsed if elapsed > 0 else 0.0,
+            'initial_objective': initial,
+            'final_objective': best,
+            'improvement': best - initial,
+            'cases_added': len(best_placements) - initial_cases
+        }
+        return best_placements
+    
+    def _prepare_surgeries(self, surgeries_list):
+        """
+        Order the surgeries for scheduling and predict each of them once.
+        
+        Returns:
+            tuple: (surgeries_df sorted by complexity and age, with 'Scheduled
+            Start' parsed, and a dict of predictions keyed by its index)
+        """
+        # Sort surgeries by complexity and age
+        surgeries_df = pd.DataFrame(surgeries_list)
+        surgeries_df['complexity'] = (surgeries_df['Pre-op Prep Time (min)'] + 
+                                    surgeries_df['Anesthesia Time (min)'] + 
+                                    surgeries_df['Positioning Time (min)']) / 3
+        
+        # Parse the requested start times once rather than for every candidate slot
+        surgeries_df['Scheduled Start'] = pd.to_datetime(surgeries_df['Scheduled Start'], format='mixed')
+        surgeries_df = surgeries_df.sort_values(['complexity', 'Patient Age'], 
+                                              ascending=[False, False])
+        
+        # Predict every surgery once, in one batch; nothing below depends on the slot
+        self._reset_stats()
+        predictions = self._predict(surgeries_df).to_dict('index')
+        return surgeries_df, predictions
+    
+    def _time_needed(self, surgery, prediction):
+        """Return the OR time a surgery blocks, cleanup included, in minutes and in slots."""
+        # Use the actual duration from training data if available
+        if 'Total OR Time (min)' in surgery:
+            total_time_needed = surgery['Total OR Time (min)'] + self.cleanup_time
+        else:
+            total_time_needed = prediction['Predicted_Duration'] + self.cleanup_time
+        
+        return total_time_needed, int(np.ceil(total_time_needed / self.slot_minutes))
+    
+    def _recovery(self, surgery, total_time_needed):
+        """
+        PACU slots (first, end) of a surgery relative to its start slot.
+        
+        The patient takes a bed when the surgery ends, before the OR is
+        cleaned, plus the case's 'PACU Delay (min)' wait for a bed when it has
+        one (as the historical cases do), or pacu_wait minutes when it has none
+        but says its 'PACU Bed Ready (Y/N)' is N. The bed is kept for the case's
+        'Recovery Time (min)', or recovery_time minutes if it gives none.
+        """
+        wait, stay = surgery.get('PACU Delay (min)'), surgery.get('Recovery Time (min)')
+        if wait is None or pd.isna(wait):
+            wait = self.pacu_wait if surgery.get('PACU Bed Ready (Y/N)') == 'N' else 0
+        first = total_time_needed - self.cleanup_time + wait
+        end = first + (self.recovery_time if stay is None or pd.isna(stay) else stay)
+        return int(first // self.slot_minutes), int(np.ceil(end / self.slot_minutes))
+    
+    def _staff(self, surgery):
+        """
+        Staff members of a surgery, by name, for the calendar's staff timelines.
+        
+        A person has one timeline whatever role they fill, and appears once
+        even if they are named in two roles of the same case.
+        """
+        return tuple(dict.fromkeys(surgery[role] for role in self.staff_roles
+                                   if role in surgery and pd.notna(surgery[role])))
+    
+    def _schedule_entry(self, surgery, prediction, slot_datetime, or_idx, total_time_needed):
+        """Build the schedule row for a surgery placed at slot_datetime in an OR."""
+        return {
+            'Surgery Type': surgery['Surgery Type'],
+            'Patient Age': surgery['Patient Age'],
+            'Surgeon': surgery['Surgeon'],
+            'Scheduled Date': slot_datetime.date(),
+            'Scheduled Time': slot_datetime.strftime('%H:%M'),
+            'Operating Room': or_idx + 1,
+            'Estimated Duration': total_time_needed - self.cleanup_time,
+            'Delay Risk': prediction['Predicted_Delay'],
+            'Original Time': pd.to_datetime(surgery['Scheduled Start']).strftime('%Y-%m-%d %H:%M')
+        }
+    
+    def _build_schedule(self, surgeries_df, predictions, days, placements):
+        """
+        Create the final schedule from placements keyed by position in surgeries_df.
+        
+        Rows keep the surgeries' index (their position in the surgeries list);
+        attrs['total_score'] is the sum of the placed surgeries' scores,
+        attrs['pacu_peak'] the most patients in recovery at once on each day
+        and attrs['reclaimed_minutes'] the OR minutes each day saves over
+        30-minute slots.
+        """
+        scheduled_surgeries = []
+        pacu_stays = []
+        booked_times = []
+        for position, (day, or_idx, slot, _) in placements.items():
+            index = surgeries_df.index[position]
+            surgery = surgeries_df.iloc[position]
+            total_time_needed, _ = self._time_needed(surgery.to_dict(), predictions[index])
+            scheduled_surgeries.append(self._schedule_entry(
+                surgery, predictions[index], self._slot_datetime(days, day, slot), or_idx, total_time_needed
+            ))
+            booked_times.append((day, total_time_needed))
+            first, end = self._recovery(surgery, total_time_needed)
+            pacu_stays.append((day, slot + first, slot + end))
+        
         if not scheduled_surgeries:
             return pd.DataFrame()
-            
-        schedule_df = pd.DataFrame(scheduled_surgeries)
+        
+        schedule_df = pd.DataFrame(scheduled_surgeries,
+                                   index=[surgeries_df.index[position] for position in placements])
         schedule_df = schedule_df.sort_values(['Scheduled Date', 'Scheduled Time', 'Operating Room'])
+        schedule_df.attrs['total_score'] = float(sum(placement[3] for placement in placements.values()))
+        schedule_df.attrs['pacu_peak'] = self._pacu_peaks(days, pacu_stays)
+        schedule_df.attrs['reclaimed_minutes'] = self._reclaimed_minutes(days, booked_times)
         return schedule_df
-
-    def _find_best_slot(self, surgery, available_slots, slots_needed):
-        """Find the best slot for a surgery in the given available slots."""
-        best_slot = None
-        best_score = -float('inf')
-        
-        # Group slots by OR
-        for or_num in available_slots['OR'].unique():
-            or_slots = available_slots[available_slots['OR'] == or_num]
+    
+    def _reclaimed_minutes(self, days, booked_times):
+        """
+        OR minutes each day gains over 30-minute slots, from (day, total_time_needed) of its cases.
+        
+        A case blocks its time rounded up to whole slots; the difference
+        between that rounding at 30 minutes and at slot_minutes is OR time
+        left free for other cases.
+        """
+        reclaimed = dict.fromkeys((str(date.date()) for date in days), 0)
+        for day, total_time_needed in booked_times:
+            baseline = int(np.ceil(total_time_needed / 30)) * 30
+            blocked = int(np.ceil(total_time_needed / self.slot_minutes)) * self.slot_minutes
+            reclaimed[str(days[day].date())] += baseline - blocked
+        return reclaimed
+    
+    def _pacu_peaks(self, days, stays):
+        """Most patients in recovery at once on each day, from (day, first slot, end slot) PACU stays."""
+        events = [[] for _ in days]
+        for day, first, end in stays:
+            events[day] += [(first, 1), (end, -1)]
+        
+        peaks = {}
+        for day, day_events in enumerate(events):
+            # Sweep the day in time order; a bed freed in a slot is free for that slot
+            occupancy = peak = 0
+            for _, change in sorted(day_events):
+                occupancy += change
+                peak = max(peak, occupancy)
+            peaks[str(days[day].date())] = peak
+        return peaks
+    
+    def create_multistart_schedule(self, surgeries_list, start_date, runs=16, workers=None, seed=42,
+                                   improve_iterations=0):
+        """
+        Run the greedy placement from many orderings in parallel and keep the best.
+        
+        Run 0 uses the usual complexity/age order, run 1 places the longest
+        cases first, run 2 goes by requested start time, and every other run
+        uses a random order seeded with (seed, run), so results do not depend
+        on how runs are spread over the workers. The surgeries are predicted
+        once here; the worker processes receive the predictions when they
+        start and never load the models.
+        
+        Args:
+            surgeries_list: List of dictionaries containing surgery information
+            start_date: datetime object for the start of the week
+            runs (int): Number of orderings to try
+            workers (int, optional): Worker processes (defaults to the CPU count)
+            seed (int): Base random seed
+            improve_iterations (int): Local-search moves after each greedy run
+        
+        Returns:
+            DataFrame with the schedule with the best objective (placement_reward
+            per scheduled case plus its score); attrs['multistart'] has the
+            objective of every run, the best run and the wall time
+        """
+        started = time.perf_counter()
+        surgeries_df, predictions = self._prepare_surgeries(surgeries_list)
+        workers = min(workers or os.cpu_count() or 1, runs)
+        
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self, surgeries_df, predictions, start_date)
+        ) as executor:
+            results = list(executor.map(
+                _run_multistart, range(runs), [seed] * runs, [improve_iterations] * runs
+            ))
+        
+        # Highest objective wins, the earliest run on ties
+        objectives = [objective for objective, _ in results]
+        best_run = int(np.argmax(objectives))
+        
+        days, _ = self._get_available_slots(start_date)
+        schedule_df = self._build_schedule(surgeries_df, predictions, days, results[best_run][1])
+        schedule_df.attrs['multistart'] = {
+            'runs': runs,
+            'workers': workers,
+            'best_run': best_run,
+            'objectives': objectives,
+            'seconds': time.perf_counter() - started
+        }
+        return schedule_df
+    
+    def _multistart_order(self, surgeries_df, predictions, run, seed):
+        """Placement order (positions in surgeries_df) for one multi-start run."""
+        if run == 0:
+            return np.arange(len(surgeries_df))
+        if run == 1:
+            slots_needed = [self._time_needed(surgery.to_dict(), predictions[index])[1]
+                            for index, surgery in surgeries_df.iterrows()]
+            return np.argsort(-np.array(slots_needed), kind='stable')
+        if run == 2:
+            return np.argsort(surgeries_df['Scheduled Start'].to_numpy(), kind='stable')
+        return np.random.default_rng([seed, run]).permutation(len(surgeries_df))
+    
+    def create_day_parallel_schedule(self, surgeries_list, start_date, workers=None):
+        """
+        Schedule each day's surgeries in its own worker process, then place the rest.
+        
+        Surgeries are grouped by their preferred day, and each day is filled
+        independently and concurrently, in the usual complexity/age order,
+        with that day's surgeries only. A second, sequential pass gives every
+        surgery that did not fit (or whose preferred day is outside the week)
+        its best slot in what is left of the whole week. Unlike
+        create_weekly_schedule, surgeries that spill over to another day can
+        no longer take the slots of that day's own surgeries.
+        
+        Args:
+            surgeries_list: List of dictionaries containing surgery information
+            start_date: datetime object for the start of the week
+            workers (int, optional): Worker processes (defaults to the CPU count)
+        
+        Returns:
+            DataFrame with the schedule; attrs['day_parallel'] has the number of
+            surgeries per day, the spill-over count and the time of each pass
+        """
+        started = time.perf_counter()
+        surgeries_df, predictions = self._prepare_surgeries(surgeries_list)
+        days, calendar = self._get_available_slots(start_date)
+        
+        # Positions of each day's surgeries, in scheduling order
+        day_dates = [date.date() for date in days]
+        day_positions = [[] for _ in days]
+        for position, preferred_start in enumerate(surgeries_df['Scheduled Start']):
+            if preferred_start.date() in day_dates:
+                day_positions[day_dates.index(preferred_start.date())].append(position)
+        
+        active_days = [day for day in range(len(days)) if day_positions[day]]
+        workers = max(1, min(workers or os.cpu_count() or 1, len(active_days)))
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self, surgeries_df, predictions, start_date)
+        ) as executor:
+            day_placements = list(executor.map(
+                _run_day, [day_positions[day] for day in active_days]
+            ))
+        days_done = time.perf_counter()
+        
+        # Merge the days, then place the spill-over across the whole week
+        placements = {}
+        for day_result in day_placements:
+            for position, (day, or_idx, slot, score) in day_result.items():
+                surgery_dict = surgeries_df.iloc[position].to_dict()
+                total_time_needed, slots_needed = self._time_needed(surgery_dict,
+                                                                    predictions[surgeries_df.index[position]])
+                calendar.reserve(day, or_idx, slot, slots_needed, self._staff(surgery_dict),
+                                 self._recovery(surgery_dict, total_time_needed))
+                placements[position] = (day, or_idx, slot, score)
+        
+        spill_over = [position for position in range(len(surgeries_df)) if position not in placements]
+        placements.update(self._place_greedily(surgeries_df, predictions, days, calendar, spill_over))
+        
+        schedule_df = self._build_schedule(surgeries_df, predictions, days, dict(sorted(placements.items())))
+        schedule_df.attrs['day_parallel'] = {
+            'surgeries_per_day': {str(day_dates[day]): len(day_positions[day]) for day in active_days},
+            'spill_over': len(spill_over),
+            'workers': workers,
+            'day_seconds': days_done - started,
+            'spill_over_seconds': time.perf_counter() - days_done
+        }
+        return schedule_df
+    
+    def create_optimal_schedule(self, surgeries_list, start_date, time_limit=10.0):
+        """
+        Solve the week as an integer program instead of placing cases greedily.
+        
+        Each case gets one binary variable per day and start slot, worth
+        placement_reward plus the case's score there; at every slot no more
+        cases may overlap than there are ORs, no staff member may be in two
+        of them and no more patients may be in recovery than there are PACU
+        beds. ORs are interchangeable, so overlapping intervals are then
+        assigned to ORs in start order. The model is solved with HiGHS through
+        scipy.optimize.milp.
+        
+        The greedy schedule is computed first and returned instead whenever
+        the solver finds nothing better within the time limit. The model has
+        a column per start slot, so it grows with finer slot_minutes, and
+        HiGHS may overrun time_limit on its first LP at 5- or 10-minute slots.
+        
+        Args:
+            surgeries_list: List of dictionaries containing surgery information
+            start_date: datetime object for the start of the week
+            time_limit (float): Wall-clock budget for the solver in seconds
+        
+        Returns:
+            DataFrame with the schedule; attrs has 'engine' ('mip' or
+            'greedy'), 'total_score', 'objective', 'bound', 'mip_gap' and
+            'solve_time'
+        """
+        # Only the exact engine needs SciPy (milp is in scipy >= 1.9)
+        from scipy import sparse
+        from scipy.optimize import Bounds, LinearConstraint, milp
+        
+        started = time.perf_counter()
+        surgeries_df, predictions = self._prepare_surgeries(surgeries_list)
+        days, calendar = self._get_available_slots(start_date)
+        greedy_df = self._build_schedule(
+            surgeries_df, predictions, days, self._place_greedily(surgeries_df, predictions, days, calendar)
+        )
+        greedy_objective = (greedy_df.attrs.get('total_score', 0.0) +
+                            self.placement_reward * len(greedy_df))
+        
+        slots_per_day = calendar.occupied.shape[2]
+        slot_times = self._slot_times(days, slots_per_day)
+        
+        # One column per (case, day, start slot); rows are slot capacities, then one per case
+        cases, starts, lengths, scores = [], [], [], []
+        case_recovery = np.zeros((len(surgeries_df), 2), dtype=np.int64)
+        for case, (index, surgery) in enumerate(surgeries_df.iterrows()):
+            surgery_dict = surgery.to_dict()
+            total_time_needed, slots_needed = self._time_needed(surgery_dict, predictions[index])
+            if slots_needed > slots_per_day:
+                continue
+            if self.pacu_beds is not None:
+                case_recovery[case] = self._recovery(surgery_dict, total_time_needed)
+            window_slots = slot_times[:, :slots_per_day - slots_needed + 1]
+            case_scores = self._score_slots(surgery_dict, predictions[index], window_slots)
+            day_grid, slot_grid = np.indices(window_slots.shape)
+            cases.append(np.full(window_slots.size, case))
+            starts.append((day_grid * slots_per_day + slot_grid).ravel())
+            lengths.append(np.full(window_slots.size, slots_needed))
+            scores.append(case_scores.ravel())
+        
+        if not cases:
+            greedy_df.attrs.update(engine='greedy', objective=greedy_objective, bound=greedy_objective,
+                                   mip_gap=0.0, solve_time=time.perf_counter() - started)
+            return greedy_df
+        
+        cases, starts = np.concatenate(cases), np.concatenate(starts)
+        lengths, scores = np.concatenate(lengths), np.concatenate(scores)
+        n_vars, n_slots = len(cases), len(days) * slots_per_day
+        
+        # Column j covers slots starts[j] .. starts[j] + lengths[j] - 1
+        rows = np.repeat(starts, lengths) + (np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths))
+        capacity = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, np.repeat(np.arange(n_vars), lengths))), shape=(n_slots, n_vars)
+        )
+        assignment = sparse.csr_matrix(
+            (np.ones(n_vars), (cases, np.arange(n_vars))), shape=(len(surgeries_df), n_vars)
+        )
+        constraints = [
+            LinearConstraint(capacity, 0, self.operating_rooms),
+            LinearConstraint(assignment, 0, 1)
+        ]
+        
+        # One row per staff member and slot: each member works one case at a time
+        member_ids = {}
+        case_members = [[member_ids.setdefault(member, len(member_ids)) for member in self._staff(surgery.to_dict())]
+                        for _, surgery in surgeries_df.iterrows()]
+        if member_ids:
+            entry_columns = np.repeat(np.arange(n_vars), lengths)
+            staff_rows, staff_columns = [], []
+            for k in range(max(len(members) for members in case_members)):
+                # k-th staff member of the case behind every covered (slot, column) entry
+                member = np.array([members[k] if k < len(members) else -1
+                                   for members in case_members])[cases[entry_columns]]
+                staffed = member >= 0
+                staff_rows.append(member[staffed] * n_slots + rows[staffed])
+                staff_columns.append(entry_columns[staffed])
+            staff_rows, staff_columns = np.concatenate(staff_rows), np.concatenate(staff_columns)
+            staff_load = sparse.csr_matrix(
+                (np.ones(len(staff_rows)), (staff_rows, staff_columns)), shape=(len(member_ids) * n_slots, n_vars)
+            )
+            constraints.append(LinearConstraint(staff_load, 0, 1))
+        
+        # One row per day and PACU slot: patients in recovery never outnumber the beds
+        if self.pacu_beds is not None:
+            first, end = case_recovery[cases].T
+            pacu_lengths = end - first
+            start_days, start_slots = np.divmod(starts, slots_per_day)
+            pacu_slots = int(max(slots_per_day, (start_slots + end).max()))
+            pacu_rows = (np.repeat(start_days * pacu_slots + start_slots + first, pacu_lengths) +
+                         (np.arange(pacu_lengths.sum()) - np.repeat(np.cumsum(pacu_lengths) - pacu_lengths, pacu_lengths)))
+            pacu_load = sparse.csr_matrix(
+                (np.ones(len(pacu_rows)), (pacu_rows, np.repeat(np.arange(n_vars), pacu_lengths))),
+                shape=(len(days) * pacu_slots, n_vars)
+            )
+            constraints.append(LinearConstraint(pacu_load, 0, self.pacu_beds))
+        
+        result = milp(
+            -(scores + self.placement_reward),
+            constraints=constraints,
+            integrality=np.ones(n_vars),
+            bounds=Bounds(0, 1),
+            options={'time_limit': max(time_limit - (time.perf_counter() - started), 1.0)}
+        )
+        bound = -result.mip_dual_bound if getattr(result, 'mip_dual_bound', None) is not None else np.nan
+        
+        if result.x is None or -result.fun <= greedy_objective:
+            schedule_df, objective = greedy_df, greedy_objective
+            schedule_df.attrs['engine'] = 'greedy'
+        else:
+            objective = -result.fun
+            chosen = np.flatnonzero(result.x > 0.5)
             
-            # Look for consecutive available slots
-            for i in range(len(or_slots)):
-                if i + slots_needed > len(or_slots):
-                    break
-                    
-                consecutive_slots = or_slots.iloc[i:i + slots_needed]
-                
-                # Check if all slots are available and consecutive in time
-                if (all(consecutive_slots['available']) and
-                    len(consecutive_slots['datetime'].unique()) == slots_needed):
-                    
-                    slot = consecutive_slots.iloc[0]
-                    score = self._calculate_surgery_score(surgery, slot['datetime'])
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_slot = slot
-        
-        return best_slot, best_score
-
+            # Any interval set whose overlap never exceeds the OR count fits the ORs in start order
+            placements = {}
+            or_free_at = np.zeros((len(days), self.operating_rooms), dtype=np.int64)
+            for j in chosen[np.lexsort((cases[chosen], starts[chosen]))]:
+                day, slot = divmod(int(starts[j]), slots_per_day)
+                or_idx = int(np.flatnonzero(or_free_at[day] <= slot)[0])
+                or_free_at[day, or_idx] = slot + lengths[j]
+                placements[int(cases[j])] = (day, or_idx, slot, float(scores[j]))
+            schedule_df = self._build_schedule(surgeries_df, predictions, days, placements)
+            schedule_df.attrs['engine'] = 'mip'
+        
+        bound = max(bound, objective) if np.isfinite(bound) else np.nan
+        schedule_df.attrs.update(
+            objective=objective,
+            bound=bound,
+            mip_gap=(bound - objective) / max(abs(objective), 1.0) if np.isfinite(bound) else np.nan,
+            solve_time=time.perf_counter() - started
+        )
+        return schedule_df
+    
+    def _find_best_slot(self, surgery, prediction, slot_times, windows):
+        """
+        Pick the highest-scoring window for a surgery.
+        
+        Args:
+            windows: (or_idx, day, slot) arrays from SlotCalendar.free_windows;
+                the first of equal scores wins
+        
+        Returns:
+            tuple: ((day, OR index, start slot), score), or (None, -inf) if
+            there are no windows
+        """
+        or_indices, days, slots = windows
+        if len(slots) == 0:
+            return None, -float('inf')
+        
+        scores = self._score_slots(surgery, prediction, slot_times[days, slots])
+        best = int(np.argmax(scores))
+        self.stats['scored_slots'] += len(slots)
+        
+        return (int(days[best]), int(or_indices[best]), int(slots[best])), float(scores[best])
+    
     def print_schedule(self, schedule_df):
         """Print the schedule in a readable format."""
         if schedule_df.empty:
             print("\nNo surgeries could be scheduled.")
             return
-            
+        
         current_date = None
         
         print("\nWeekly Surgery Schedule")
@@ -213,6 +1162,13 @@ class SurgeryScheduleOptimizer:
             if current_date != surgery['Scheduled Date']:
                 current_date = surgery['Scheduled Date']
                 print(f"\n{current_date.strftime('%A, %B %d, %Y')}")
+                if 'pacu_peak' in schedule_df.attrs:
+                    peak = schedule_df.attrs['pacu_peak'].get(str(current_date), 0)
+                    beds = '' if self.pacu_beds is None else f" of {self.pacu_beds} beds"
+                    print(f"Peak PACU occupancy: {peak}{beds}")
+                if self.slot_minutes != 30 and 'reclaimed_minutes' in schedule_df.attrs:
+                    print(f"OR minutes reclaimed over 30-minute slots: "
+                          f"{schedule_df.attrs['reclaimed_minutes'].get(str(current_date), 0)}")
                 print("-" * 100)
             
             print(f"OR {surgery['Operating Room']} | {surgery['Scheduled Time']} | "
@@ -223,6 +1179,34 @@ class SurgeryScheduleOptimizer:
                   f"Delay Risk: {surgery['Delay Risk']} | "
                   f"Original Time: {surgery['Original Time']}")
 
+# Worker process state for the parallel engines, set once per process by _init_worker
+_worker_state = None
+
+def _init_worker(optimizer, surgeries_df, predictions, start_date):
+    global _worker_state
+    _worker_state = (optimizer, surgeries_df, predictions, start_date)
+
+def _run_day(positions):
+    """Place one day's surgeries on that day only; returns their placements."""
+    optimizer, surgeries_df, predictions, start_date = _worker_state
+    days, calendar = optimizer._get_available_slots(start_date)
+    return optimizer._place_greedily(surgeries_df, predictions, days, calendar, positions,
+                                     preferred_only=True)
+
+def _run_multistart(run, seed, improve_iterations):
+    """Place all surgeries in the order of one run; returns (objective, placements)."""
+    optimizer, surgeries_df, predictions, start_date = _worker_state
+    days, calendar = optimizer._get_available_slots(start_date)
+    order = optimizer._multistart_order(surgeries_df, predictions, run, seed)
+    placements = optimizer._place_greedily(surgeries_df, predictions, days, calendar, order)
+    if improve_iterations:
+        placements = optimizer._improve_schedule(
+            surgeries_df, predictions, days, calendar, placements, improve_iterations, seed=[seed, run]
+        )
+    objective = (sum(placement[3] for placement in placements.values()) +
+                 optimizer.placement_reward * len(placements))
+    return objective, placements
+
 # Example usage
 if __name__ == "__main__":
     # Example list of surgeries to be scheduled
@@ -0,0 +1,397 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime
+
+# Slot owners besides case ids
+_FREE = -1
+_BUFFER = -2
+
+class ScheduleSession:
+    """
+    A weekly schedule that stays in memory and is edited one case at a time.
+    
+    The session keeps the optimizer's SlotCalendar and every case's prediction,
+    so adding, cancelling or moving a case only touches that case's slots and
+    never re-runs the weekly optimization. Every edit returns the list of
+    changed assignments.
+    
+    The last emergency_buffer minutes of every OR day are held back from
+    elective cases and used first by insert_emergency. Buffer time an
+    emergency takes goes back to the buffer when it is cancelled or moved.
+    """
+    def __init__(self, optimizer, start_date, surgeries_list=None):
+        """
+        Args:
+            optimizer: SurgeryScheduleOptimizer that supplies the calendar,
+                scoring and predictions
+            start_date: First day of the week
+            surgeries_list: Cases to book up front with the greedy pass; they
+                get their position in the list as case id
+        """
+        self.optimizer = optimizer
+        self.start_date = start_date
+        self.days, self.calendar = optimizer._get_available_slots(start_date)
+        self.slot_times = optimizer._slot_times(self.days, self.calendar.occupied.shape[2])
+        self.cases = {}
+        self._next_id = 0
+        
+        # Case id occupying every (day, OR, slot), or _FREE/_BUFFER
+        self.owner = np.full(self.calendar.occupied.shape, _FREE, dtype=np.int64)
+        slots_per_day = self.owner.shape[2]
+        buffer_slots = min(int(np.ceil(optimizer.emergency_buffer / optimizer.slot_minutes)), slots_per_day)
+        if buffer_slots:
+            for day in range(len(self.days)):
+                for or_idx in range(optimizer.operating_rooms):
+                    self.calendar.reserve(day, or_idx, slots_per_day - buffer_slots, buffer_slots)
+            self.owner[:, :, slots_per_day - buffer_slots:] = _BUFFER
+        
+        if surgeries_list:
+            surgeries_df, predictions = optimizer._prepare_surgeries(surgeries_list)
+            placements = optimizer._place_greedily(surgeries_df, predictions, self.days, self.calendar)
+            for position, index in enumerate(surgeries_df.index):
+                surgery = surgeries_df.iloc[position].drop('complexity').to_dict()
+                placement = placements.get(position)
+                case = self._case(
+                    surgery, predictions[index], tuple(int(v) for v in placement[:3]) if placement else None
+                )
+                self.cases[int(index)] = case
+                if placement is not None:
+                    day, or_idx, slot = case['placement']
+                    self.owner[day, or_idx, slot:slot + case['slots_needed']] = int(index)
+            self._next_id = len(surgeries_list)
+    
+    def _case(self, surgery, prediction, placement):
+        total_time_needed, slots_needed = self.optimizer._time_needed(surgery, prediction)
+        return {
+            'surgery': surgery,
+            'prediction': prediction,
+            'total_time_needed': total_time_needed,
+            'slots_needed': slots_needed,
+            'staff': self.optimizer._staff(surgery),
+            'recovery': self.optimizer._recovery(surgery, total_time_needed),
+            'placement': placement,
+            'buffer_slots': [],
+            'emergency': False
+        }
+    
+    def _book(self, case_id):
+        """Reserve the slots of a case's placement, taking any buffer slots in it out of the buffer."""
+        case = self.cases[case_id]
+        day, or_idx, slot = case['placement']
+        case['buffer_slots'] = [slot + int(offset) for offset in
+                                np.flatnonzero(self.owner[day, or_idx, slot:slot + case['slots_needed']] == _BUFFER)]
+        for buffer_slot in case['buffer_slots']:
+            self.calendar.release(day, or_idx, buffer_slot, 1)
+        self.calendar.reserve(day, or_idx, slot, case['slots_needed'], case['staff'], case['recovery'])
+        self.owner[day, or_idx, slot:slot + case['slots_needed']] = case_id
+    
+    def _unbook(self, case_id):
+        """Free the slots of a case's placement, giving its buffer slots back; the placement is kept."""
+        case = self.cases[case_id]
+        day, or_idx, slot = case['placement']
+        self.calendar.release(day, or_idx, slot, case['slots_needed'], case['staff'], case['recovery'])
+        self.owner[day, or_idx, slot:slot + case['slots_needed']] = _FREE
+        for buffer_slot in case['buffer_slots']:
+            self.calendar.reserve(day, or_idx, buffer_slot, 1)
+            self.owner[day, or_idx, buffer_slot] = _BUFFER
+        case['buffer_slots'] = []
+    
+    def _assignment(self, placement):
+        """Date, time and OR of a (day, OR index, slot) placement, or None if unscheduled."""
+        if placement is None:
+            return None
+        day, or_idx, slot = placement
+        slot_datetime = self.optimizer._slot_datetime(self.days, day, slot)
+        return {
+            'scheduled_date': slot_datetime.strftime('%Y-%m-%d'),
+            'scheduled_time': slot_datetime.strftime('%H:%M'),
+            'operating_room': or_idx + 1
+        }
+    
+    def _change(self, case_id, change, before, after):
+        return {
+            'case_id': case_id,
+            'change': change,
+            'before': self._assignment(before),
+            'after': self._assignment(after)
+        }
+    
+    def _get_case(self, case_id):
+        if case_id not in self.cases:
+            raise KeyError(f"Unknown case {case_id}")
+        return self.cases[case_id]
+    
+    def _best_placement(self, case):
+        """Best free (day, OR index, slot) for a case, preferred day first, or None."""
+        surgery, prediction = case['surgery'], case['prediction']
+        preferred_days = [day for day, date in enumerate(self.days)
+                          if date.date() == surgery['Scheduled Start'].date()]
+        
+        for day_indices in (preferred_days, range(len(self.days))):
+            best_slot, _ = self.optimizer._find_best_slot(
+                surgery, prediction, self.slot_times,
+                self.calendar.free_windows(case['slots_needed'], day_indices, case['staff'], case['recovery'])
+            )
+            if best_slot is not None:
+                return tuple(int(v) for v in best_slot)
+        return None
+    
+    def _target_placement(self, case, date, time, operating_room):
+        """Translate a requested date, time and OR into a (day, OR index, slot) placement."""
+        day, or_idx, slot = case['placement'] if case['placement'] else (None, None, None)
+        
+        if date is not None:
+            date = pd.to_datetime(date).date()
+            matches = [i for i, day_date in enumerate(self.days) if day_date.date() == date]
+            if not matches:
+                raise ValueError(f"{date} is not a day of this schedule")
+            day = matches[0]
+        if time is not None:
+            time = datetime.strptime(time, '%H:%M')
+            minutes = (time.hour - self.optimizer.start_hour) * 60 + time.minute
+            slot_minutes = self.optimizer.slot_minutes
+            if minutes < 0 or minutes % slot_minutes or minutes // slot_minutes >= self.calendar.occupied.shape[2]:
+                raise ValueError(f"{time.strftime('%H:%M')} is not the start of a {slot_minutes}-minute slot "
+                                 f"within operating hours")
+            slot = minutes // slot_minutes
+        if operating_room is not None:
+            if not 1 <= operating_room <= self.optimizer.operating_rooms:
+                raise ValueError(f"Operating room {operating_room} does not exist")
+            or_idx = operating_room - 1
+        
+        if None in (day, or_idx, slot):
+            raise ValueError("An unscheduled case needs a date, time and operating room to be moved to")
+        return day, or_idx, slot
+    
+    def add(self, surgery):
+        """
+        Book a new case in its best free slot.
+        
+        Args:
+            surgery: Dictionary with the surgery information
+        
+        Returns:
+            tuple: (case id, list of changes)
+        """
+        surgery = dict(surgery)
+        surgery['Scheduled Start'] = pd.to_datetime(surgery['Scheduled Start'])
+        prediction = self.optimizer._predict([surgery]).iloc[0].to_dict()
+        
+        case_id = self._next_id
+        self._next_id += 1
+        case = self._case(surgery, prediction, None)
+        case['placement'] = self._best_placement(case)
+        self.cases[case_id] = case
+        if case['placement'] is not None:
+            self._book(case_id)
+        
+        return case_id, [self._change(case_id, 'added' if case['placement'] else 'unscheduled',
+                                      None, case['placement'])]
+    
+    def cancel(self, case_id):
+        """
+        Remove a case and free its slots.
+        
+        Raises:
+            KeyError: If the case is not in the session
+        """
+        case = self._get_case(case_id)
+        if case['placement'] is not None:
+            self._unbook(case_id)
+        del self.cases[case_id]
+        return [self._change(case_id, 'cancelled', case['placement'], None)]
+    
+    def move(self, case_id, date=None, time=None, operating_room=None):
+        """
+        Move a case to a given date, time and/or OR, or to its best free slot.
+        
+        Anything not given keeps its current value; with nothing given the case
+        is re-placed in the best slot that is free once its own slots are
+        released.
+        
+        Args:
+            date (str): Target day as YYYY-MM-DD
+            time (str): Target start time as HH:MM, on the optimizer's slot grid
+            operating_room (int): Target OR, numbered from 1
+        
+        Raises:
+            KeyError: If the case is not in the session
+            ValueError: If the target does not exist or is not free; the case
+                then keeps its slot
+        """
+        case = self._get_case(case_id)
+        before = case['placement']
+        explicit = date is not None or time is not None or operating_room is not None
+        target = self._target_placement(case, date, time, operating_room) if explicit else None
+        
+        if before is not None:
+            self._unbook(case_id)
+        if explicit and not self.calendar.is_free(*target, case['slots_needed'], case['staff'], case['recovery']):
+            if before is not None:
+                self._book(case_id)
+            raise ValueError(f"The requested slot is not free for case {case_id}")
+        
+        case['placement'] = target if explicit else self._best_placement(case)
+        after = case['placement']
+        if after is not None:
+            self._book(case_id)
+        
+        if after == before:
+            return []
+        return [self._change(case_id, 'moved' if after else 'unscheduled', before, after)]
+    
+    def _pacu_fits(self, day, slot, recovery, bumped):
+        """Whether a case starting at slot finds a PACU bed once the bumped cases are gone."""
+        if recovery is None or self.calendar.pacu_beds is None:
+            return True
+        first, end = slot + recovery[0], slot + recovery[1]
+        occupancy = self.calendar.pacu[day, first:end].copy()
+        for case_id in bumped:
+            case = self.cases[case_id]
+            case_first = case['placement'][2] + case['recovery'][0]
+            case_end = case['placement'][2] + case['recovery'][1]
+            occupancy[max(case_first, first) - first:max(min(case_end, end) - first, 0)] -= 1
+        return bool((occupancy < self.calendar.pacu_beds).all())
+    
+    def _emergency_placement(self, case, arrival):
+        """
+        Find where an emergency case goes, looking only at the first day from
+        arrival on that can take it.
+        
+        A window of free and buffer slots is used if the day has one, the
+        earliest first. Otherwise the window is the one that bumps the fewest
+        elective cases, then the lowest total priority (their slot score),
+        then the earliest. Cases in other ORs that share staff with the
+        emergency and overlap the window are bumped as well, and a window is
+        only taken if the emergency then finds a PACU bed. Other emergencies
+        are never bumped.
+        
+        Returns:
+            tuple: ((day, OR index, slot), ids of the cases to bump), or None
+        """
+        slots_needed, staff = case['slots_needed'], case['staff']
+        slots_per_day = self.owner.shape[2]
+        for day, date in enumerate(self.days):
+            if date.date() < arrival.date():
+                continue
+            first_slot = 0
+            if date.date() == arrival.date():
+                minutes = (arrival - pd.Timestamp(self.slot_times[day, 0])).total_seconds() / 60
+                first_slot = max(0, int(np.ceil(minutes / self.optimizer.slot_minutes)))
+            
+            # The day's cases that need one of the emergency's staff, with their slot ranges
+            sharing = [(case_id, other['placement'][2], other['placement'][2] + other['slots_needed'])
+                       for case_id, other in self.cases.items()
+                       if other['placement'] is not None and other['placement'][0] == day
+                       and set(other['staff']) & set(staff)]
+            
+            priorities = {}
+            best_key, best = None, None
+            for or_idx in range(self.optimizer.operating_rooms):
+                owners = self.owner[day, or_idx]
+                for slot in range(first_slot, slots_per_day - slots_needed + 1):
+                    bumped = set(int(owner) for owner in owners[slot:slot + slots_needed] if owner >= 0)
+                    bumped.update(case_id for case_id, start, end in sharing
+                                  if start < slot + slots_needed and end > slot)
+                    if any(self.cases[case_id]['emergency'] for case_id in bumped):
+                        continue
+                    if not self._pacu_fits(day, slot, case['recovery'], bumped):
+                        continue
+                    for case_id in bumped - priorities.keys():
+                        other = self.cases[case_id]
+                        other_day, _, other_slot = other['placement']
+                        priorities[case_id] = self.optimizer._calculate_surgery_score(
+                            other['surgery'], self.optimizer._slot_datetime(self.days, other_day, other_slot),
+                            other['prediction']
+                        )
+                    key = (len(bumped), sum(priorities[case_id] for case_id in bumped), slot, or_idx)
+                    if best_key is None or key < best_key:
+                        best_key, best = key, ((day, or_idx, slot), sorted(
+                            bumped, key=lambda case_id: priorities[case_id], reverse=True))
+            if best is not None:
+                return best
+        return None
+    
+    def insert_emergency(self, surgery, arrival=None):
+        """
+        Book an urgent case at the earliest feasible time, bumping electives if needed.
+        
+        The emergency uses free and buffer time on the first day it fits;
+        failing that it bumps the fewest, lowest-priority elective cases of
+        that day. Bumped cases, highest priority first, are re-placed in their
+        best free slot elsewhere in the week or left unscheduled.
+        
+        Args:
+            surgery: Dictionary with the surgery information
+            arrival: Earliest start time (defaults to the case's 'Scheduled Start')
+        
+        Returns:
+            tuple: (case id, changes), where changes starts with the
+            emergency's own assignment, followed by the new slot (or
+            unscheduling) of every bumped case
+        """
+        surgery = dict(surgery)
+        surgery['Scheduled Start'] = pd.to_datetime(surgery['Scheduled Start'])
+        arrival = surgery['Scheduled Start'] if arrival is None else pd.to_datetime(arrival)
+        prediction = self.optimizer._predict([surgery]).iloc[0].to_dict()
+        
+        case_id = self._next_id
+        self._next_id += 1
+        case = self._case(surgery, prediction, None)
+        case['emergency'] = True
+        self.cases[case_id] = case
+        
+        found = self._emergency_placement(case, arrival)
+        if found is None:
+            return case_id, [self._change(case_id, 'unscheduled', None, None)]
+        
+        placement, bumped = found
+        for bumped_id in bumped:
+            self._unbook(bumped_id)
+        case['placement'] = placement
+        self._book(case_id)
+        
+        changes = [self._change(case_id, 'added', None, placement)]
+        for bumped_id in bumped:
+            bumped_case = self.cases[bumped_id]
+            before = bumped_case['placement']
+            bumped_case['placement'] = self._best_placement(bumped_case)
+            if bumped_case['placement'] is not None:
+                self._book(bumped_id)
+            changes.append(self._change(bumped_id, 'moved' if bumped_case['placement'] else 'unscheduled',
+                                        before, bumped_case['placement']))
+        return case_id, changes
+    
+    def schedule(self):
+        """
+        The current schedule as a DataFrame, with the case id of every booked
+        case; attrs['pacu_peak'] has the most patients in recovery at once on
+        each day and attrs['reclaimed_minutes'] the OR minutes each day saves
+        over 30-minute slots.
+        """
+        entries = []
+        booked_times = []
+        for case_id, case in self.cases.items():
+            if case['placement'] is None:
+                continue
+            day, or_idx, slot = case['placement']
+            entry = self.optimizer._schedule_entry(
+                case['surgery'], case['prediction'],
+                self.optimizer._slot_datetime(self.days, day, slot), or_idx, case['total_time_needed']
+            )
+            entries.append({'Case ID': case_id, **entry, 'Emergency': case['emergency']})
+            booked_times.append((day, case['total_time_needed']))
+        
+        if not entries:
+            return pd.DataFrame()
+        
+        schedule_df = pd.DataFrame(entries)
+        schedule_df = schedule_df.sort_values(['Scheduled Date', 'Scheduled Time', 'Operating Room'])
+        schedule_df.attrs['pacu_peak'] = {str(date.date()): int(peak)
+                                          for date, peak in zip(self.days, self.calendar.pacu.max(axis=1))}
+        schedule_df.attrs['reclaimed_minutes'] = self.optimizer._reclaimed_minutes(self.days, booked_times)
+        return schedule_df
+    
+    def unscheduled(self):
+        """Ids of the cases that currently have no slot."""
+        return [case_id for case_id, case in self.cases.items() if case['placement'] is None]
@@ -0,0 +1,100 @@
+import pandas as pd
+import numpy as np
+from surgery_scheduler import get_model_artifact, predict_surgery_trees
+
+def simulate_schedule(schedule_df, surgeries, optimizer, scenarios=10_000, delay_minutes=None, seed=42,
+                      return_samples=False):
+    """
+    Simulate how a finished schedule plays out and report overtime per OR and day.
+    
+    Every scenario draws, for each case, one tree of the forests: the
+    duration is that tree's prediction, and the case starts late with that
+    tree's delay probability, by a delay drawn from the delayed training
+    cases (the quantiles stored with the model). A case starts at its
+    scheduled time plus its delay, or when the previous case in its OR is
+    done and cleaned up, whichever is later, so delays and overruns carry
+    over along each OR's day. Overtime is how long after the optimizer's
+    end_hour the last case's cleanup finishes.
+    
+    Args:
+        schedule_df: Schedule from SurgeryScheduleOptimizer, indexed by
+            position in the surgeries list
+        surgeries: The surgeries list (or DataFrame) the schedule was made from;
+            surgeries[index] is the surgery of each schedule row
+        optimizer: The SurgeryScheduleOptimizer that made the schedule; its
+            end_hour and cleanup_time are used
+        scenarios (int): Number of scenarios to draw
+        delay_minutes: Start delays to sample from (defaults to the model
+            artifact's delay_quantiles)
+        seed (int): Random seed
+        return_samples (bool): Also return the simulated overtime
+    
+    Returns:
+        DataFrame: One row per OR and day with its scheduled end and overtime
+        statistics in minutes; with return_samples, also the overtime array of
+        shape (scenarios, OR days) in the row order of the report
+    """
+    if schedule_df.empty:
+        report = pd.DataFrame(columns=['Scheduled Date', 'Operating Room', 'Cases', 'Scheduled End',
+                                       'Overtime Probability', 'Mean Overtime (min)',
+                                       'P50 Overtime (min)', 'P90 Overtime (min)',
+                                       'P95 Overtime (min)', 'Max Overtime (min)'])
+        return (report, np.zeros((scenarios, 0))) if return_samples else report
+    
+    end_hour, cleanup_time = optimizer.end_hour, optimizer.cleanup_time
+    if delay_minutes is None:
+        delay_minutes = get_model_artifact()['delay_quantiles']
+    delay_minutes = np.asarray(delay_minutes, dtype=np.float64)
+    
+    # Cases in OR-day order, each OR day's cases in time order
+    cases = schedule_df.sort_values(['Scheduled Date', 'Operating Room', 'Scheduled Time'])
+    if isinstance(surgeries, pd.DataFrame):
+        surgery_rows = surgeries.loc[cases.index]
+    else:
+        surgery_rows = pd.DataFrame([surgeries[index] for index in cases.index])
+    tree_delay_prob, tree_duration = predict_surgery_trees(surgery_rows)
+    
+    scheduled_minutes = np.array([int(hours) * 60 + int(minutes) for hours, minutes in
+                                  cases['Scheduled Time'].str.split(':')], dtype=np.float64)
+    group_keys = list(zip(cases['Scheduled Date'], cases['Operating Room']))
+    groups = pd.factorize(pd.Series(group_keys))[0]
+    num_cases, num_groups = len(cases), groups.max() + 1
+    
+    # Column of each case in a (group, position in the OR's day) grid, -1 for padding
+    positions = np.arange(num_cases) - np.searchsorted(groups, groups)
+    grid = np.full((num_groups, positions.max() + 1), -1, dtype=np.int64)
+    grid[groups, positions] = np.arange(num_cases)
+    
+    # Draw one tree per case and scenario for both the delay and the duration
+    rng = np.random.default_rng(seed)
+    trees = rng.integers(tree_duration.shape[1], size=(scenarios, num_cases))
+    rows = np.arange(num_cases)
+    duration = tree_duration[rows, trees]
+    delayed = rng.random((scenarios, num_cases)) < tree_delay_prob[rows, trees % tree_delay_prob.shape[1]]
+    delay = np.where(delayed, rng.choice(delay_minutes, size=(scenarios, num_cases)), 0.0)
+    
+    # Walk every OR day in step, one case position at a time
+    ready = np.full((scenarios, num_groups), -np.inf)
+    for position in range(grid.shape[1]):
+        has_case = grid[:, position] >= 0
+        columns = grid[has_case, position]
+        start = np.maximum(scheduled_minutes[columns] + delay[:, columns], ready[:, has_case])
+        ready[:, has_case] = start + duration[:, columns] + cleanup_time
+    overtime = np.maximum(ready - end_hour * 60, 0.0)
+    
+    last_case = grid[np.arange(num_groups), (grid >= 0).sum(axis=1) - 1]
+    scheduled_end = (scheduled_minutes[last_case] + cases['Estimated Duration'].to_numpy()[last_case]
+                     + cleanup_time)
+    report = pd.DataFrame({
+        'Scheduled Date': [group_keys[column][0] for column in last_case],
+        'Operating Room': [group_keys[column][1] for column in last_case],
+        'Cases': (grid >= 0).sum(axis=1),
+        'Scheduled End': [f"{int(end) // 60:02d}:{int(end) % 60:02d}" for end in np.ceil(scheduled_end)],
+        'Overtime Probability': (overtime > 0).mean(axis=0),
+        'Mean Overtime (min)': overtime.mean(axis=0),
+        'P50 Overtime (min)': np.percentile(overtime, 50, axis=0),
+        'P90 Overtime (min)': np.percentile(overtime, 90, axis=0),
+        'P95 Overtime (min)': np.percentile(overtime, 95, axis=0),
+        'Max Overtime (min)': overtime.max(axis=0)
+    })
+    return (report, overtime) if return_samples else report
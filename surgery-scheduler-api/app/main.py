@@ -7,12 +7,21 @@ import sys
 import os
 import pandas as pd
 import io
+import uuid
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from time import monotonic
 
 # Add the parent directory to sys.path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import our scheduling system
-from .surgery_scheduler import predict_surgery, display_model_performance
+from .surgery_scheduler import (
+    predict_surgery, predict_surgeries, display_model_performance, prediction_cache_info,
+    get_inference_engine, get_model_metrics, memory_usage
+)
+from .schedule_optimizer import SurgeryScheduleOptimizer
+from .schedule_session import ScheduleSession
 
 app = FastAPI(title="Surgery Scheduler API")
 
@@ -73,6 +82,191 @@ class BatchImportResponse(BaseModel):
     schedule: List[ScheduledSurgery]
     errors: List[str]
 
+class SessionRequest(BaseModel):
+    surgeries: List[Surgery] = []
+    start_date: str
+
+class MoveRequest(BaseModel):
+    scheduled_date: Optional[str] = None
+    scheduled_time: Optional[str] = None
+    operating_room: Optional[int] = None
+
+class SessionSurgery(ScheduledSurgery):
+    case_id: int
+    emergency: bool = False
+
+class Assignment(BaseModel):
+    scheduled_date: str
+    scheduled_time: str
+    operating_room: int
+
+class ScheduleChange(BaseModel):
+    case_id: int
+    change: str
+    before: Optional[Assignment] = None
+    after: Optional[Assignment] = None
+
+class SessionResponse(BaseModel):
+    session_id: str
+    schedule: List[SessionSurgery]
+    unscheduled: List[int]
+    changes: List[ScheduleChange]
+
+# Sessions idle for longer than this many seconds are dropped (override with SURGERY_SESSION_TTL)
+SESSION_TTL = float(os.environ.get('SURGERY_SESSION_TTL', 3600))
+
+# Most sessions kept at once; the least recently used go first (override with SURGERY_SESSION_LIMIT)
+SESSION_LIMIT = int(os.environ.get('SURGERY_SESSION_LIMIT', 100))
+
+class SessionStore:
+    """
+    Schedules being edited incrementally, by session id, least recently used first.
+    
+    Sessions live in this process's memory, so the session endpoints need the
+    API to run with a single worker (or a proxy that routes every session id
+    to the same worker); any other worker answers 404 for a session it never
+    created.
+    """
+    
+    def __init__(self, maxsize=SESSION_LIMIT, ttl=SESSION_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # session id -> (last used, session)
+    
+    def _expire(self):
+        # Entries are in order of last use, so the idle ones are at the front
+        now = monotonic()
+        while self._entries:
+            session_id, (last_used, _) = next(iter(self._entries.items()))
+            if now - last_used <= self.ttl:
+                break
+            del self._entries[session_id]
+    
+    def get(self, session_id):
+        """Return the session (marking it recently used), or None if it does not exist or expired"""
+        self._expire()
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        self._entries[session_id] = (monotonic(), entry[1])
+        self._entries.move_to_end(session_id)
+        return entry[1]
+    
+    def put(self, session_id, session):
+        self._expire()
+        self._entries[session_id] = (monotonic(), session)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def remove(self, session_id):
+        """Drop a session; return False if there was none"""
+        self._expire()
+        return self._entries.pop(session_id, None) is not None
+    
+    def info(self):
+        self._expire()
+        return {'size': len(self._entries), 'maxsize': self.maxsize, 'ttl_seconds': self.ttl}
+
+sessions = SessionStore()
+
+def surgery_to_dict(surgery: Surgery):
+    """Format a Surgery for the predictor and optimizer"""
+    return {
+        'Patient Age': surgery.patient_age,
+        'BMI': surgery.bmi,
+        'Surgery Type': surgery.surgery_type,
+        'Surgeon': surgery.surgeon,
+        'Anesthesiologist': surgery.anesthesiologist,
+        'Nurse': surgery.nurse,
+        'Day of Week': surgery.day_of_week,
+        'Pre-op Prep Time (min)': surgery.pre_op_prep_time,
+        'Transfer to OR Time (min)': surgery.transfer_to_or_time,
+        'Anesthesia Time (min)': surgery.anesthesia_time,
+        'Positioning Time (min)': surgery.positioning_time,
+        'Comorbidities': surgery.comorbidities,
+        'Instrument Ready (Y/N)': surgery.instrument_ready,
+        'PACU Bed Ready (Y/N)': surgery.pacu_bed_ready,
+        'Scheduled Start': surgery.scheduled_start,
+        'Time Preference': surgery.time_preference
+    }
+
+class StaffBookings:
+    """Booked [start, end) intervals of every staff member on every day, sorted by start"""
+    roles = ('Surgeon', 'Anesthesiologist', 'Nurse')
+    
+    def __init__(self):
+        self.intervals = {}
+    
+    def members(self, surgery, date):
+        # Keyed by name: a person booked as surgeon is just as busy when named as anesthesiologist
+        return list(dict.fromkeys((date, surgery[role]) for role in self.roles if surgery.get(role)))
+    
+    def next_free(self, members, start, minutes):
+        """Earliest time from start at which all members are free for the given minutes"""
+        moved = True
+        while moved:
+            moved = False
+            for member in members:
+                intervals = self.intervals.get(member, [])
+                # The last booking that starts before the candidate ends is the only one that can overlap it
+                i = bisect_left(intervals, (start + timedelta(minutes=minutes),)) - 1
+                if i >= 0 and intervals[i][1] > start:
+                    start, moved = intervals[i][1], True
+        return start
+    
+    def book(self, members, start, end):
+        for member in members:
+            insort(self.intervals.setdefault(member, []), (start, end))
+
+def session_surgery_dict(surgery: Surgery, start_date: datetime):
+    """Format a Surgery for a session, dating its requested start within the session's week"""
+    surgery_dict = surgery_to_dict(surgery)
+    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    if surgery.day_of_week in days:
+        date = start_date + timedelta(days=(days.index(surgery.day_of_week) - start_date.weekday()) % 7)
+    else:
+        date = start_date
+    scheduled_start = surgery.scheduled_start or '09:00'
+    try:
+        # The web app sends the requested time as HH:MM
+        time = datetime.strptime(scheduled_start, "%H:%M")
+        surgery_dict['Scheduled Start'] = date.replace(hour=time.hour, minute=time.minute)
+    except ValueError:
+        surgery_dict['Scheduled Start'] = pd.to_datetime(scheduled_start)
+    return surgery_dict
+
+def session_response(session_id: str, changes: list):
+    """Current schedule of a session together with the changes of the last edit"""
+    session = get_session(session_id)
+    schedule = []
+    for _, row in session.schedule().iterrows():
+        schedule.append({
+            'case_id': int(row['Case ID']),
+            'surgery_type': row['Surgery Type'],
+            'patient_age': int(row['Patient Age']),
+            'surgeon': row['Surgeon'],
+            'scheduled_date': row['Scheduled Date'].strftime("%Y-%m-%d"),
+            'scheduled_time': row['Scheduled Time'],
+            'operating_room': int(row['Operating Room']),
+            'estimated_duration': float(row['Estimated Duration']),
+            'delay_risk': "High" if row['Delay Risk'] == 'High Risk' else "Low",
+            'original_time': row['Original Time'],
+            'emergency': bool(row['Emergency'])
+        })
+    return {
+        'session_id': session_id,
+        'schedule': schedule,
+        'unscheduled': session.unscheduled(),
+        'changes': changes
+    }
+
+def get_session(session_id: str):
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return session
+
 @app.get("/")
 async def root():
     return {"message": "Surgery Scheduler API is running"}
@@ -81,24 +275,7 @@ async def root():
 async def predict(surgery: Surgery):
     try:
         # Convert the Pydantic model to dict and format it for our predictor
-        surgery_dict = {
-            'Patient Age': surgery.patient_age,
-            'BMI': surgery.bmi,
-            'Surgery Type': surgery.surgery_type,
-            'Surgeon': surgery.surgeon,
-            'Anesthesiologist': surgery.anesthesiologist,
-            'Nurse': surgery.nurse,
-            'Day of Week': surgery.day_of_week,
-            'Pre-op Prep Time (min)': surgery.pre_op_prep_time,
-            'Transfer to OR Time (min)': surgery.transfer_to_or_time,
-            'Anesthesia Time (min)': surgery.anesthesia_time,
-            'Positioning Time (min)': surgery.positioning_time,
-            'Comorbidities': surgery.comorbidities,
-            'Instrument Ready (Y/N)': surgery.instrument_ready,
-            'PACU Bed Ready (Y/N)': surgery.pacu_bed_ready,
-            'Scheduled Start': surgery.scheduled_start,
-            'Time Preference': surgery.time_preference
-        }
+        surgery_dict = surgery_to_dict(surgery)
         
         prediction = predict_surgery(surgery_dict)
         
@@ -284,31 +461,24 @@ async def create_schedule(request: ScheduleRequest):
         # Convert the Pydantic models to list of dicts
         surgeries_list = []
         for surgery in request.surgeries:
-            surgery_dict = {
-                'Patient Age': surgery.patient_age,
-                'BMI': surgery.bmi,
-                'Surgery Type': surgery.surgery_type,
-                'Surgeon': surgery.surgeon,
-                'Anesthesiologist': surgery.anesthesiologist,
-                'Nurse': surgery.nurse,
-                'Day of Week': surgery.day_of_week,
-                'Pre-op Prep Time (min)': surgery.pre_op_prep_time,
-                'Transfer to OR Time (min)': surgery.transfer_to_or_time,
-                'Anesthesia Time (min)': surgery.anesthesia_time,
-                'Positioning Time (min)': surgery.positioning_time,
-                'Comorbidities': surgery.comorbidities,
-                'Instrument Ready (Y/N)': surgery.instrument_ready,
-                'PACU Bed Ready (Y/N)': surgery.pacu_bed_ready,
-                'Scheduled Start': surgery.scheduled_start,
-                'Time Preference': surgery.time_preference
-            }
-            surgeries_list.append(surgery_dict)
+            surgeries_list.append(surgery_to_dict(surgery))
         
         # Print the number of surgeries for debugging
         print(f"Processing {len(surgeries_list)} surgeries")
         
+        # Predict all surgeries in one batch; if that fails, each surgery
+        # falls back to its own prediction (and error handling) below
+        predictions = {}
+        try:
+            batch_predictions = predict_surgeries(surgeries_list)
+            for surgery, prediction in zip(surgeries_list, batch_predictions.to_dict('records')):
+                predictions[id(surgery)] = prediction
+        except Exception as e:
+            print(f"Batch prediction failed, predicting one by one: {str(e)}")
+        
         # Create a simple schedule without the optimizer
         schedule = []
+        staff_bookings = StaffBookings()
         start_date = datetime.strptime(request.start_date, "%Y-%m-%d")
         
         # Map days of week to date offsets from start_date
@@ -359,10 +529,15 @@ async def create_schedule(request: ScheduleRequest):
             # Helper function to schedule a surgery
             def schedule_surgery(surgery, or_num, current_time):
                 try:
-                    prediction = predict_surgery(surgery)
+                    prediction = predictions.get(id(surgery)) or predict_surgery(surgery)
                     duration = prediction['Predicted_Duration']
                     delay_risk = "High" if prediction['Delay_Probability'] > 0.5 else "Low"
                     
+                    # Wait until the surgeon, anesthesiologist and nurse are free in every other OR
+                    members = staff_bookings.members(surgery, current_date)
+                    current_time = staff_bookings.next_free(members, current_time, duration + 30)
+                    staff_bookings.book(members, current_time, current_time + timedelta(minutes=duration + 30))
+                    
                     time_str = current_time.strftime("%H:%M")
                     
                     # Format the date as YYYY-MM-DD
@@ -420,6 +595,81 @@ async def create_schedule(request: ScheduleRequest):
         print("Error in create_schedule:", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/sessions", response_model=SessionResponse)
+async def create_session(request: SessionRequest):
+    """
+    Start an editable schedule for a week, optionally booking a first set of surgeries.
+    
+    Sessions are kept in this worker's memory until they are deleted or sit
+    idle for SESSION_TTL seconds, so run the API with a single worker.
+    """
+    try:
+        start_date = datetime.strptime(request.start_date, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid start date format. Use YYYY-MM-DD")
+    
+    try:
+        surgeries_list = [session_surgery_dict(surgery, start_date) for surgery in request.surgeries]
+        session_id = uuid.uuid4().hex
+        optimizer = SurgeryScheduleOptimizer(predictor=predict_surgeries)
+        sessions.put(session_id, ScheduleSession(optimizer, start_date, surgeries_list))
+        return session_response(session_id, [])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/sessions/{session_id}", response_model=SessionResponse)
+async def get_session_schedule(session_id: str):
+    get_session(session_id)
+    return session_response(session_id, [])
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Discard an editable schedule"""
+    if not sessions.remove(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"message": f"Session {session_id} deleted"}
+
+@app.post("/sessions/{session_id}/surgeries", response_model=SessionResponse)
+async def add_session_surgery(session_id: str, surgery: Surgery):
+    """Book one more surgery in its best free slot without rescheduling the others"""
+    session = get_session(session_id)
+    try:
+        _, changes = session.add(session_surgery_dict(surgery, session.start_date))
+        return session_response(session_id, changes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/sessions/{session_id}/emergencies", response_model=SessionResponse)
+async def insert_session_emergency(session_id: str, surgery: Surgery):
+    """Book an urgent surgery at the earliest feasible time from its scheduled start, bumping electives if needed"""
+    session = get_session(session_id)
+    try:
+        _, changes = session.insert_emergency(session_surgery_dict(surgery, session.start_date))
+        return session_response(session_id, changes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/sessions/{session_id}/surgeries/{case_id}", response_model=SessionResponse)
+async def cancel_session_surgery(session_id: str, case_id: int):
+    session = get_session(session_id)
+    try:
+        changes = session.cancel(case_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Case {case_id} not found")
+    return session_response(session_id, changes)
+
+@app.post("/sessions/{session_id}/surgeries/{case_id}/move", response_model=SessionResponse)
+async def move_session_surgery(session_id: str, case_id: int, request: MoveRequest):
+    """Move a surgery to the given date, time and/or OR, or to its best free slot if none is given"""
+    session = get_session(session_id)
+    try:
+        changes = session.move(case_id, request.scheduled_date, request.scheduled_time, request.operating_room)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Case {case_id} not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return session_response(session_id, changes)
+
 @app.get("/template")
 async def get_template():
     """Generate and return an Excel template for batch importing surgeries"""
@@ -472,11 +722,22 @@ async def get_model_performance():
         
         return {
             "message": "Model performance metrics",
-            "performance_data": performance_data
+            "performance_data": performance_data,
+            "metrics": get_model_metrics()
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/model-info")
+async def get_model_info():
+    """Report the active model version, inference engine, prediction cache counters, open sessions and this worker's memory"""
+    return {
+        "inference_engine": get_inference_engine(),
+        "prediction_cache": prediction_cache_info(),
+        "sessions": sessions.info(),
+        "memory": memory_usage()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -1,18 +1,154 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split, StratifiedKFold
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.metrics import classification_report, mean_absolute_error, mean_squared_error
 from sklearn.preprocessing import StandardScaler
 from datetime import datetime
 import matplotlib.pyplot as plt
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import uuid
+import joblib
+import time
+from contextlib import contextmanager
+from collections import OrderedDict
+import forest_compiler
+from datetime import time as dt_time
 
-# Load the dataset
-df = pd.read_csv('/Users/ikymama/Desktop/UCLA Academics/Data Analytics/AI in operations/Final Project/AI scheduler/AI_Surgery_Scheduling_Dataset__1000_Cases_.csv')
+# Location of the historical cases used for training (override with SURGERY_DATA_PATH)
+DATA_PATH = os.environ.get(
+    'SURGERY_DATA_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AI scheduler', 'AI_Surgery_Scheduling_Dataset__1000_Cases_.csv')
+)
+
+# Location of the trained model artifact (override with SURGERY_MODEL_PATH)
+MODEL_PATH = os.environ.get(
+    'SURGERY_MODEL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'surgery_models.joblib')
+)
+
+# Columnar cache of preprocessed training data (override with SURGERY_CACHE_DIR)
+CACHE_DIR = os.environ.get('SURGERY_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'cache'))
+
+# Bump whenever preprocess_data changes, so stale cache files are not reused
+PREPROCESS_VERSION = 1
+
+# Bump whenever the layout of the saved artifact changes
+ARTIFACT_VERSION = 4
+
+# Implementation used to score the forests: 'sklearn', or 'compiled' for the
+# flat-array kernel in forest_compiler (override with SURGERY_INFERENCE_ENGINE)
+INFERENCE_ENGINES = ('sklearn', 'compiled')
+INFERENCE_ENGINE = os.environ.get('SURGERY_INFERENCE_ENGINE', 'compiled')
+
+# Number of predictions kept in memory (override with SURGERY_PREDICTION_CACHE_SIZE)
+PREDICTION_CACHE_SIZE = int(os.environ.get('SURGERY_PREDICTION_CACHE_SIZE', 4096))
+
+CATEGORICAL_COLS = ['Surgery Type', 'Surgeon', 'Day of Week', 'Anesthesiologist', 'Comorbidities', 'Nurse']
+
+# Raw numeric fields that are used as model features unchanged
+NUMERIC_COLS = [
+    'Patient Age', 'BMI', 'Pre-op Prep Time (min)', 'Transfer to OR Time (min)',
+    'Anesthesia Time (min)', 'Positioning Time (min)'
+]
+
+# Columns and compact dtypes used by the chunked (out-of-core) training loader
+CHUNKED_DTYPES = {
+    **{col: 'category' for col in CATEGORICAL_COLS},
+    'Instrument Ready (Y/N)': 'category',
+    'PACU Bed Ready (Y/N)': 'category',
+    # Age and BMI stay float64 so the risk percentiles match the in-memory path
+    'Patient Age': 'float64',
+    'BMI': 'float64',
+    'Pre-op Prep Time (min)': 'float32',
+    'Transfer to OR Time (min)': 'float32',
+    'Anesthesia Time (min)': 'float32',
+    'Positioning Time (min)': 'float32',
+    'Total OR Time (min)': 'float32'
+}
+CHUNKED_COLUMNS = list(CHUNKED_DTYPES) + ['Scheduled Start', 'Actual Start']
+
+# Fields summed into the minimum duration a prediction is allowed to return
+BASE_DURATION_COLS = [
+    'Pre-op Prep Time (min)', 'Transfer to OR Time (min)',
+    'Anesthesia Time (min)', 'Positioning Time (min)'
+]
+
+# Fitted sklearn models, saved next to the artifact and only loaded when needed
+ESTIMATOR_KEYS = ('delay_model', 'duration_model')
+
+# Module attributes that used to be computed at import time and now live in the artifact
+ARTIFACT_ATTRIBUTES = (
+    'scaler', 'feature_cols', 'age_percentiles', 'bmi_percentiles',
+    'delay_model', 'duration_model', 'rmse', 'metrics', 'model_version'
+)
+
+_artifact = None
+_encoder = None
+_inference_engine = INFERENCE_ENGINE
+_artifact_lock = threading.Lock()
+_estimator_lock = threading.Lock()
+
+# Most recently prepared training data, keyed by (path, size, mtime)
+_training_data_cache = {}
+
+class PredictionCache:
+    """
+    Bounded LRU cache of raw model outputs.
+    
+    Keys are (model_version, encoded feature row), so entries from an older
+    model can never be returned; the cache is also cleared whenever the active
+    artifact changes.
+    """
+    
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached value for key (marking it recently used), or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def info(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'maxsize': self.maxsize
+            }
 
-# Store percentile values for risk scoring
-age_percentiles = np.percentile(df['Patient Age'], [20, 40, 60, 80])
-bmi_percentiles = np.percentile(df['BMI'], [20, 40, 60, 80])
+_prediction_cache = PredictionCache()
 
 def get_risk_score(value, percentiles):
     """Calculate risk score based on percentile ranges"""
@@ -60,9 +196,10 @@ def preprocess_data(df, is_training=True):
         df['Age_Risk'] = pd.qcut(df['Patient Age'], q=5, labels=[1,2,3,4,5]).astype(int)
         df['BMI_Risk'] = pd.qcut(df['BMI'], q=5, labels=[1,2,3,4,5]).astype(int)
     else:
-        # For prediction, use pre-computed percentiles
-        df['Age_Risk'] = df['Patient Age'].apply(lambda x: get_risk_score(x, age_percentiles))
-        df['BMI_Risk'] = df['BMI'].apply(lambda x: get_risk_score(x, bmi_percentiles))
+        # For prediction, use the percentiles stored with the trained models
+        artifact = get_model_artifact()
+        df['Age_Risk'] = df['Patient Age'].apply(lambda x: get_risk_score(x, artifact['age_percentiles']))
+        df['BMI_Risk'] = df['BMI'].apply(lambda x: get_risk_score(x, artifact['bmi_percentiles']))
     
     df['Risk_Score'] = df['Age_Risk'] + df['BMI_Risk']
     
@@ -73,88 +210,866 @@ def preprocess_data(df, is_training=True):
         df['Readmission'] = (df['Readmission (Y/N)'] == 'Y').astype(int)
     
     # Create dummy variables for categorical columns
-    categorical_cols = ['Surgery Type', 'Surgeon', 'Day of Week', 'Anesthesiologist', 'Comorbidities', 'Nurse']
-    df = pd.get_dummies(df, columns=categorical_cols)
+    df = pd.get_dummies(df, columns=CATEGORICAL_COLS)
     
     return df
 
-# Preprocess the training data
-df_processed = preprocess_data(df, is_training=True)
+def get_feature_cols(df_processed):
+    """Return the model feature columns for a preprocessed training frame."""
+    return [
+        # Patient characteristics
+        'Patient Age', 'BMI', 'Age_Risk', 'BMI_Risk', 'Risk_Score',
+        
+        # Time-related features
+        'Hour', 'Is_Morning',
+        
+        # Preparation times
+        'Pre-op Prep Time (min)', 'Transfer to OR Time (min)',
+        'Anesthesia Time (min)', 'Positioning Time (min)',
+        'Complexity_Score',
+        
+        # Resource readiness
+        'Instrument Ready', 'PACU Bed Ready',
+        
+        # Keep all the dummy variables for categorical columns
+        *[col for col in df_processed.columns if any(x in col for x in [
+            'Surgery Type_', 'Surgeon_', 'Day of Week_',
+            'Anesthesiologist_', 'Comorbidities_', 'Nurse_'
+        ])]
+    ]
+
+def _parse_hour(value):
+    """Return the hour of a scheduled start given as a string, datetime or Timestamp."""
+    if hasattr(value, 'hour'):
+        return value.hour
+    try:
+        return datetime.fromisoformat(value).hour
+    except (TypeError, ValueError):
+        pass
+    try:
+        # Time-only values such as '09:00' (scheduled for today)
+        return dt_time.fromisoformat(value).hour
+    except (TypeError, ValueError):
+        return pd.Timestamp(value).hour
 
-# Define features and targets
-feature_cols = [
-    # Patient characteristics
-    'Patient Age', 'BMI', 'Age_Risk', 'BMI_Risk', 'Risk_Score',
+class FeatureEncoder:
+    """
+    Encodes raw surgery records into scaled model input rows without pandas.
     
-    # Time-related features
-    'Hour', 'Is_Morning',
+    Built from the training vocabulary (the dummy columns in feature_cols), the
+    risk percentiles and the fitted scaler, and produces exactly the values
+    preprocess_data + scaler.transform would. Without a scaler it produces the
+    unscaled features.
+    """
     
-    # Preparation times
-    'Pre-op Prep Time (min)', 'Transfer to OR Time (min)',
-    'Anesthesia Time (min)', 'Positioning Time (min)',
-    'Complexity_Score',
+    def __init__(self, feature_cols, age_percentiles, bmi_percentiles, scaler=None):
+        self.feature_cols = list(feature_cols)
+        self.n_features = len(self.feature_cols)
+        self.age_percentiles = np.asarray(age_percentiles, dtype=float)
+        self.bmi_percentiles = np.asarray(bmi_percentiles, dtype=float)
+        if scaler is None:
+            self.mean = np.zeros(self.n_features)
+            self.scale = np.ones(self.n_features)
+        else:
+            self.mean = np.asarray(scaler.mean_, dtype=float)
+            self.scale = np.asarray(scaler.scale_, dtype=float)
+        
+        index = {col: i for i, col in enumerate(self.feature_cols)}
+        self._numeric = [(index[col], col) for col in NUMERIC_COLS]
+        self._age_risk = index['Age_Risk']
+        self._bmi_risk = index['BMI_Risk']
+        self._risk_score = index['Risk_Score']
+        self._hour = index['Hour']
+        self._is_morning = index['Is_Morning']
+        self._complexity = index['Complexity_Score']
+        self._instrument_ready = index['Instrument Ready']
+        self._pacu_bed_ready = index['PACU Bed Ready']
+        
+        # Dummy column position for every (categorical column, value) seen in training
+        self._categories = {col: {} for col in CATEGORICAL_COLS}
+        for name, i in index.items():
+            for col in CATEGORICAL_COLS:
+                prefix = f"{col}_"
+                if name.startswith(prefix):
+                    self._categories[col][name[len(prefix):]] = i
+                    break
     
-    # Resource readiness
-    'Instrument Ready', 'PACU Bed Ready',
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls(artifact['feature_cols'], artifact['age_percentiles'],
+                   artifact['bmi_percentiles'], artifact['scaler'])
     
-    # Keep all the dummy variables for categorical columns
-    *[col for col in df_processed.columns if any(x in col for x in [
-        'Surgery Type_', 'Surgeon_', 'Day of Week_',
-        'Anesthesiologist_', 'Comorbidities_', 'Nurse_'
-    ])]
-]
+    def encode(self, surgery, out=None):
+        """
+        Encode one surgery dict into a scaled feature row.
+        
+        Args:
+            surgery (dict): Surgery information, as passed to predict_surgery
+            out (np.ndarray, optional): Preallocated float row to write into
+        
+        Returns:
+            np.ndarray: The scaled feature row
+        """
+        row = np.zeros(self.n_features) if out is None else out
+        if out is not None:
+            row.fill(0.0)
+        
+        for i, col in self._numeric:
+            row[i] = surgery[col]
+        
+        hour = _parse_hour(surgery['Scheduled Start'])
+        row[self._hour] = hour
+        row[self._is_morning] = 1 if hour < 12 else 0
+        row[self._complexity] = (
+            surgery['Pre-op Prep Time (min)'] +
+            surgery['Anesthesia Time (min)'] +
+            surgery['Positioning Time (min)']
+        ) / 3
+        
+        age_risk = get_risk_score(surgery['Patient Age'], self.age_percentiles)
+        bmi_risk = get_risk_score(surgery['BMI'], self.bmi_percentiles)
+        row[self._age_risk] = age_risk
+        row[self._bmi_risk] = bmi_risk
+        row[self._risk_score] = age_risk + bmi_risk
+        
+        row[self._instrument_ready] = 1 if surgery['Instrument Ready (Y/N)'] == 'Y' else 0
+        row[self._pacu_bed_ready] = 1 if surgery['PACU Bed Ready (Y/N)'] == 'Y' else 0
+        
+        # Values never seen in training have no dummy column and stay all-zero
+        for col, positions in self._categories.items():
+            i = positions.get(str(surgery[col]))
+            if i is not None:
+                row[i] = 1
+        
+        row -= self.mean
+        row /= self.scale
+        return row
+    
+    def encode_frame(self, df):
+        """
+        Encode every row of a DataFrame of raw surgeries into a scaled feature matrix.
+        
+        Args:
+            df: DataFrame with the same fields as predict_surgery takes
+        
+        Returns:
+            np.ndarray: Array of shape (len(df), n_features)
+        """
+        X = np.zeros((len(df), self.n_features))
+        
+        for i, col in self._numeric:
+            X[:, i] = df[col].to_numpy(dtype=float)
+        
+        # Parse each start time on its own so rows with different formats can be mixed
+        hour = pd.to_datetime(df['Scheduled Start'], format='mixed').dt.hour.to_numpy()
+        X[:, self._hour] = hour
+        X[:, self._is_morning] = hour < 12
+        X[:, self._complexity] = (
+            df['Pre-op Prep Time (min)'] +
+            df['Anesthesia Time (min)'] +
+            df['Positioning Time (min)']
+        ).to_numpy(dtype=float) / 3
+        
+        # Same binning as get_risk_score: number of percentiles strictly below the value, plus one
+        age_risk = np.searchsorted(self.age_percentiles, df['Patient Age'].to_numpy(dtype=float), side='left') + 1
+        bmi_risk = np.searchsorted(self.bmi_percentiles, df['BMI'].to_numpy(dtype=float), side='left') + 1
+        X[:, self._age_risk] = age_risk
+        X[:, self._bmi_risk] = bmi_risk
+        X[:, self._risk_score] = age_risk + bmi_risk
+        
+        X[:, self._instrument_ready] = (df['Instrument Ready (Y/N)'] == 'Y').to_numpy()
+        X[:, self._pacu_bed_ready] = (df['PACU Bed Ready (Y/N)'] == 'Y').to_numpy()
+        
+        rows = np.arange(len(df))
+        for col, positions in self._categories.items():
+            positions_series = df[col].astype(str).map(positions)
+            found = positions_series.notna().to_numpy()
+            X[rows[found], positions_series[found].to_numpy(dtype=int)] = 1
+        
+        X -= self.mean
+        X /= self.scale
+        return X
 
-X = df_processed[feature_cols]
-y_delay = df_processed['Delay Flag']
-y_time = df_processed['Total OR Time (min)']
-
-# Split data
-X_train, X_test, y_delay_train, y_delay_test = train_test_split(X, y_delay, test_size=0.2, random_state=42)
-_, _, y_time_train, y_time_test = train_test_split(X, y_time, test_size=0.2, random_state=42)
-
-# Scale features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-# Train models with better parameters
-delay_model = RandomForestClassifier(
-    n_estimators=100,
-    max_depth=10,
-    min_samples_split=5,
-    min_samples_leaf=2,
-    random_state=42
-)
+@contextmanager
+def _timed(timings, stage):
+    """Record the wall time of a training stage in timings[stage] (seconds)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
 
-duration_model = RandomForestRegressor(
-    n_estimators=100,
-    max_depth=15,
-    min_samples_split=5,
-    min_samples_leaf=2,
-    random_state=42
-)
+def _file_digest(path):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_preprocessed_data(data_path=DATA_PATH, cache_dir=CACHE_DIR):
+    """
+    Return preprocess_data(pd.read_csv(data_path), is_training=True), cached on disk.
+    
+    The result is stored as an uncompressed Feather (Arrow IPC) file named after
+    the SHA-256 of the CSV, so any change to the source invalidates it. Cached
+    files are memory-mapped on reload, skipping CSV and datetime parsing and
+    the feature engineering. Without pyarrow, or with an empty cache_dir, the
+    data is simply preprocessed.
+    """
+    try:
+        import pyarrow.feather as feather
+    except ImportError:
+        feather = None
+    
+    if feather is None or not cache_dir:
+        return preprocess_data(pd.read_csv(data_path), is_training=True)
+    
+    cache_path = os.path.join(cache_dir, f"{_file_digest(data_path)}-v{PREPROCESS_VERSION}.feather")
+    if os.path.exists(cache_path):
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+    
+    df_processed = preprocess_data(pd.read_csv(data_path), is_training=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    feather.write_feather(df_processed, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, cache_path)
+    return df_processed
+
+def _prepare_training_data(data_path):
+    """
+    Load the historical cases, split them and assign cross-validation folds.
+    
+    The result is cached in memory per file (path, size and modification time),
+    so retraining or re-evaluating in the same process skips parsing and
+    feature engineering.
+    
+    Returns:
+        dict: feature_cols, percentiles, the train/test feature frames and
+        targets, the (train, test) index pairs of the shared CV folds and the
+        start delays of the delayed cases
+    """
+    stat = os.stat(data_path)
+    cache_key = (os.path.abspath(data_path), stat.st_size, stat.st_mtime_ns)
+    if cache_key in _training_data_cache:
+        return _training_data_cache[cache_key]
+    
+    # Load the preprocessed dataset
+    df_processed = load_preprocessed_data(data_path)
+    
+    # Store percentile values for risk scoring
+    age_percentiles = np.percentile(df_processed['Patient Age'], [20, 40, 60, 80])
+    bmi_percentiles = np.percentile(df_processed['BMI'], [20, 40, 60, 80])
+    
+    # Define features and targets
+    feature_cols = get_feature_cols(df_processed)
+    X = df_processed[feature_cols]
+    y_delay = df_processed['Delay Flag']
+    y_time = df_processed['Total OR Time (min)']
+    
+    # Split once for both targets
+    X_train, X_test, y_delay_train, y_delay_test, y_time_train, y_time_test = train_test_split(
+        X, y_delay, y_time, test_size=0.2, random_state=42
+    )
+    
+    # One fold assignment for both models, stratified on the delay flag
+    # (the same folds cross_val_score used for the delay model)
+    folds = list(StratifiedKFold(n_splits=5).split(X_train, y_delay_train))
+    
+    data = {
+        'feature_cols': feature_cols,
+        'age_percentiles': age_percentiles,
+        'bmi_percentiles': bmi_percentiles,
+        'X_train': X_train,
+        'X_test': X_test,
+        'y_delay_train': y_delay_train.to_numpy(),
+        'y_delay_test': y_delay_test.to_numpy(),
+        'y_time_train': y_time_train.to_numpy(),
+        'y_time_test': y_time_test.to_numpy(),
+        'folds': folds,
+        'delayed_minutes': df_processed.loc[df_processed['Delay Flag'] == 1, 'Start Delay (min)'].to_numpy(),
+        'rows_read': len(df_processed),
+        'rows_used': len(df_processed)
+    }
+    _training_data_cache.clear()
+    _training_data_cache[cache_key] = data
+    return data
+
+def _read_chunks(data_path, chunksize, columns):
+    """Iterate over the case history in chunks, reading only the given columns with compact dtypes."""
+    dtypes = {col: CHUNKED_DTYPES[col] for col in columns if col in CHUNKED_DTYPES}
+    return pd.read_csv(data_path, usecols=columns, dtype=dtypes, chunksize=chunksize)
+
+def _start_delays(chunk):
+    """Start Delay (min) for a chunk of historical cases, as preprocess_data computes it."""
+    scheduled = pd.to_datetime(chunk['Scheduled Start'])
+    actual = pd.to_datetime(chunk['Actual Start'])
+    return ((actual - scheduled).dt.total_seconds() / 60).to_numpy()
+
+def _delay_flags(chunk):
+    """Delay Flag for a chunk of historical cases, as preprocess_data computes it."""
+    return (_start_delays(chunk) > 10).astype(int)
+
+def _prepare_training_data_chunked(data_path, chunksize=100_000, sample_size=None, random_state=42):
+    """
+    Build the training matrices from a large case history in bounded memory.
+    
+    The CSV is read twice in chunks with categorical and downcast dtypes: first
+    to collect the category vocabulary and delay-class counts, then to encode
+    the selected rows straight into preallocated float32 train/test matrices.
+    With sample_size, an exact sample of that many rows stratified on the delay
+    flag is used, so memory is bounded by the sample instead of the history.
+    
+    Returns:
+        dict: Same layout as _prepare_training_data, with NumPy matrices
+    """
+    rng = np.random.default_rng(random_state)
+    
+    # Pass 1: category vocabulary and delay-class counts
+    vocabulary = {col: set() for col in CATEGORICAL_COLS}
+    class_counts = np.zeros(2, dtype=np.int64)
+    for chunk in _read_chunks(data_path, chunksize, CATEGORICAL_COLS + ['Scheduled Start', 'Actual Start']):
+        for col in CATEGORICAL_COLS:
+            vocabulary[col].update(str(value) for value in chunk[col].dropna().unique())
+        class_counts += np.bincount(_delay_flags(chunk), minlength=2)
+    
+    # Dummy columns in the order get_dummies would create them
+    dummy_cols = [f"{col}_{value}" for col in CATEGORICAL_COLS for value in sorted(vocabulary[col])]
+    feature_cols = get_feature_cols(pd.DataFrame(columns=dummy_cols))
+    
+    # Choose which rows to keep (per class, by their position within the class)
+    rows_read = int(class_counts.sum())
+    if sample_size is None or sample_size >= rows_read:
+        chosen = None
+        rows_used = rows_read
+    else:
+        per_class = np.floor(class_counts * sample_size / rows_read).astype(np.int64)
+        per_class[np.argmax(class_counts)] += sample_size - per_class.sum()
+        chosen = [np.sort(rng.choice(class_counts[c], per_class[c], replace=False)) for c in (0, 1)]
+        rows_used = int(per_class.sum())
+    
+    # Same test fraction as train_test_split(test_size=0.2)
+    n_test = int(np.ceil(0.2 * rows_used))
+    is_test = np.zeros(rows_used, dtype=bool)
+    is_test[rng.choice(rows_used, n_test, replace=False)] = True
+    
+    n_features = len(feature_cols)
+    X_train = np.empty((rows_used - n_test, n_features), dtype=np.float32)
+    X_test = np.empty((n_test, n_features), dtype=np.float32)
+    y_delay = np.empty(rows_used, dtype=int)
+    y_time = np.empty(rows_used)
+    start_delay = np.empty(rows_used)
+    age = np.empty(rows_used)
+    bmi = np.empty(rows_used)
+    
+    # Pass 2: encode the kept rows chunk by chunk (risk columns are filled in afterwards)
+    encoder = FeatureEncoder(feature_cols, np.zeros(4), np.zeros(4))
+    seen = np.zeros(2, dtype=np.int64)
+    position = train_position = test_position = 0
+    for chunk in _read_chunks(data_path, chunksize, CHUNKED_COLUMNS):
+        minutes = _start_delays(chunk)
+        delay = (minutes > 10).astype(int)
+        if chosen is not None:
+            keep = np.zeros(len(chunk), dtype=bool)
+            for c in (0, 1):
+                in_class = delay == c
+                ordinals = seen[c] + np.arange(in_class.sum())
+                seen[c] += in_class.sum()
+                keep[in_class] = np.isin(ordinals, chosen[c], assume_unique=True)
+            chunk = chunk[keep]
+            delay = delay[keep]
+            minutes = minutes[keep]
+        n = len(chunk)
+        if n == 0:
+            continue
+        
+        chunk = chunk.assign(**{'Scheduled Start': pd.to_datetime(chunk['Scheduled Start'])})
+        X_chunk = encoder.encode_frame(chunk)
+        chunk_is_test = is_test[position:position + n]
+        n_chunk_test = int(chunk_is_test.sum())
+        X_train[train_position:train_position + n - n_chunk_test] = X_chunk[~chunk_is_test]
+        X_test[test_position:test_position + n_chunk_test] = X_chunk[chunk_is_test]
+        train_position += n - n_chunk_test
+        test_position += n_chunk_test
+        
+        y_delay[position:position + n] = delay
+        start_delay[position:position + n] = minutes
+        y_time[position:position + n] = chunk['Total OR Time (min)'].to_numpy(dtype=float)
+        age[position:position + n] = chunk['Patient Age'].to_numpy(dtype=float)
+        bmi[position:position + n] = chunk['BMI'].to_numpy(dtype=float)
+        position += n
+    
+    # Risk scores need the percentiles of every kept row
+    age_percentiles = np.percentile(age, [20, 40, 60, 80])
+    bmi_percentiles = np.percentile(bmi, [20, 40, 60, 80])
+    age_risk = np.searchsorted(age_percentiles, age, side='left') + 1
+    bmi_risk = np.searchsorted(bmi_percentiles, bmi, side='left') + 1
+    for col, values in (('Age_Risk', age_risk), ('BMI_Risk', bmi_risk), ('Risk_Score', age_risk + bmi_risk)):
+        i = feature_cols.index(col)
+        X_train[:, i] = values[~is_test]
+        X_test[:, i] = values[is_test]
+    
+    y_delay_train = y_delay[~is_test]
+    folds = list(StratifiedKFold(n_splits=5).split(X_train, y_delay_train))
+    
+    return {
+        'feature_cols': feature_cols,
+        'age_percentiles': age_percentiles,
+        'bmi_percentiles': bmi_percentiles,
+        'X_train': X_train,
+        'X_test': X_test,
+        'y_delay_train': y_delay_train,
+        'y_delay_test': y_delay[is_test],
+        'y_time_train': y_time[~is_test],
+        'y_time_test': y_time[is_test],
+        'folds': folds,
+        'delayed_minutes': start_delay[y_delay == 1],
+        'rows_read': rows_read,
+        'rows_used': rows_used
+    }
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where it can't be measured."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _fit_and_score(model, X, y, train_idx, test_idx):
+    model.fit(X[train_idx], y[train_idx])
+    return model.score(X[test_idx], y[test_idx])
+
+def _cross_validate(delay_model, duration_model, X_train_scaled, y_delay_train, y_time_train, folds, n_jobs=None):
+    """
+    Cross-validate both models on the shared folds, running all fold fits in parallel.
+    
+    Scores are accuracy for the delay model and R^2 for the duration model,
+    as with cross_val_score.
+    """
+    jobs = [
+        (name, model, y)
+        for name, model, y in (('delay', delay_model, y_delay_train), ('duration', duration_model, y_time_train))
+    ]
+    scores = joblib.Parallel(n_jobs=n_jobs, prefer='threads')(
+        joblib.delayed(_fit_and_score)(clone(model).set_params(n_jobs=1), X_train_scaled, y, train_idx, test_idx)
+        for _, model, y in jobs
+        for train_idx, test_idx in folds
+    )
+    
+    n_folds = len(folds)
+    result = {}
+    for i, (name, _, _) in enumerate(jobs):
+        model_scores = np.array(scores[i * n_folds:(i + 1) * n_folds])
+        result[name] = {
+            'scores': [float(score) for score in model_scores],
+            'mean': float(model_scores.mean()),
+            'std': float(model_scores.std())
+        }
+    return result
+
+def train(data_path=DATA_PATH, model_path=MODEL_PATH, cross_validate=True, n_jobs=-1,
+          chunksize=None, sample_size=None):
+    """
+    Train the delay and duration models and save them as one artifact.
+    
+    Args:
+        data_path (str): CSV file with the historical surgery cases
+        model_path (str): Where to write the model artifact
+        cross_validate (bool): Cross-validate the models on the training split;
+            if False the artifact's metrics have no cross-validation scores
+        n_jobs (int): Cores used for fitting (-1 for all of them)
+        chunksize (int, optional): Read the CSV in chunks of this many rows and
+            build the feature matrix in bounded memory
+        sample_size (int, optional): Train on a sample of this many cases,
+            stratified on the delay flag (implies chunked loading)
+    
+    Returns:
+        dict: The artifact that was saved; artifact['timings'] has the wall
+        time of each training stage in seconds and artifact['training_stats']
+        the rows read/used and the peak RSS
+    """
+    timings = {}
+    
+    # Chunked/sampled loader settings, kept in the artifact to record how the split was drawn
+    loader = None
+    if chunksize or sample_size:
+        loader = {'chunksize': chunksize or 100_000, 'sample_size': sample_size, 'random_state': 42}
+    
+    with _timed(timings, 'load_and_preprocess'):
+        if loader:
+            data = _prepare_training_data_chunked(data_path, **loader)
+        else:
+            data = _prepare_training_data(data_path)
+    feature_cols = data['feature_cols']
+    y_delay_train, y_delay_test = data['y_delay_train'], data['y_delay_test']
+    y_time_train, y_time_test = data['y_time_train'], data['y_time_test']
+    
+    # Scale features (in place for the chunked loader's own float32 matrices)
+    with _timed(timings, 'scale'):
+        scaler = StandardScaler(copy=not isinstance(data['X_train'], np.ndarray))
+        X_train_scaled = scaler.fit_transform(data['X_train'])
+        X_test_scaled = scaler.transform(data['X_test'])
+        scaler.set_params(copy=True)
+    
+    # Train models with better parameters
+    delay_model = RandomForestClassifier(
+        n_estimators=100,
+        max_depth=10,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        random_state=42,
+        n_jobs=n_jobs
+    )
+    
+    duration_model = RandomForestRegressor(
+        n_estimators=100,
+        max_depth=15,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        random_state=42,
+        n_jobs=n_jobs
+    )
+    
+    # Train both models at the same time; each one also builds its trees in parallel
+    with _timed(timings, 'fit'):
+        joblib.Parallel(n_jobs=2, prefer='threads')(
+            joblib.delayed(model.fit)(X_train_scaled, y)
+            for model, y in ((delay_model, y_delay_train), (duration_model, y_time_train))
+        )
+    
+    # Predict single-threaded: it is deterministic and avoids thread start-up on tiny batches
+    delay_model.set_params(n_jobs=None)
+    duration_model.set_params(n_jobs=None)
+    
+    # Evaluate models once, here, and keep the results as plain data
+    with _timed(timings, 'evaluate'):
+        y_delay_pred = delay_model.predict(X_test_scaled)
+        y_time_pred = duration_model.predict(X_test_scaled)
+        mae = float(mean_absolute_error(y_time_test, y_time_pred))
+        rmse = float(np.sqrt(mean_squared_error(y_time_test, y_time_pred)))
+        metrics = {
+            'delay_report': _plain(classification_report(y_delay_test, y_delay_pred, output_dict=True)),
+            'mae': mae,
+            'rmse': rmse,
+            'cross_validation': None
+        }
+    
+    if cross_validate:
+        with _timed(timings, 'cross_validate'):
+            metrics['cross_validation'] = _cross_validate(
+                delay_model, duration_model, X_train_scaled, y_delay_train, y_time_train,
+                data['folds'], n_jobs=n_jobs
+            )
+    
+    # Export both forests to flat arrays and check them against sklearn on the test set
+    with _timed(timings, 'compile'):
+        compiled_models = compile_models(delay_model, duration_model, X_test_scaled)
+    
+    trained_at = datetime.now()
+    artifact = {
+        'artifact_version': ARTIFACT_VERSION,
+        'model_version': f"{trained_at.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}",
+        'trained_at': trained_at.isoformat(),
+        'data_path': os.path.abspath(data_path),
+        'loader': loader,
+        'scaler': scaler,
+        'feature_cols': feature_cols,
+        'age_percentiles': data['age_percentiles'],
+        'bmi_percentiles': data['bmi_percentiles'],
+        'delay_quantiles': _delay_quantiles(data['delayed_minutes']),
+        'delay_model': delay_model,
+        'duration_model': duration_model,
+        'compiled_models': compiled_models,
+        'rmse': rmse,
+        'metrics': metrics,
+        'timings': timings,
+        'training_stats': {
+            'rows_read': data['rows_read'],
+            'rows_used': data['rows_used'],
+            'peak_rss_mb': _peak_rss_mb()
+        }
+    }
+    
+    with _timed(timings, 'save'):
+        save_model(artifact, model_path)
+    set_model_artifact(artifact)
+    return artifact
+
+def _delay_quantiles(delayed_minutes):
+    """
+    Start delays of the delayed training cases as 1001 quantiles (0.1% steps).
+    
+    Drawing uniformly from them reproduces the empirical delay distribution
+    (used by schedule_simulation), without keeping the history around.
+    """
+    if len(delayed_minutes) == 0:
+        return np.zeros(1)
+    return np.percentile(delayed_minutes, np.linspace(0, 100, 1001))
+
+def _plain(value):
+    """Convert NumPy scalars inside nested dicts/lists to built-in Python types."""
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def compile_models(delay_model, duration_model, X_check):
+    """
+    Flatten both forests for the compiled inference engine.
+    
+    The compiled forests are only marked as validated if they reproduce the
+    sklearn outputs bit for bit on X_check.
+    """
+    compiled_delay = forest_compiler.compile_forest(delay_model)
+    compiled_duration = forest_compiler.compile_forest(duration_model)
+    validated = (
+        forest_compiler.matches_sklearn(compiled_delay, delay_model, X_check) and
+        forest_compiler.matches_sklearn(compiled_duration, duration_model, X_check)
+    )
+    if not validated:
+        print("Compiled forests do not match sklearn; the compiled engine will not be used.")
+    
+    return {
+        'delay_model': compiled_delay,
+        'duration_model': compiled_duration,
+        'validated': validated
+    }
+
+def _estimators_path(model_path):
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.estimators{ext}"
+
+def _dump(value, path):
+    # Write to a temporary file first so readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(value, tmp_path)
+    os.replace(tmp_path, path)
+
+def save_model(artifact, model_path=MODEL_PATH):
+    """
+    Write a model artifact to disk.
+    
+    The fitted sklearn models go to a separate file next to model_path, so
+    workers that only score with the compiled forests never load them. The
+    main file is written uncompressed, which lets load_model memory-map its
+    arrays.
+    """
+    directory = os.path.dirname(model_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    estimators = {key: artifact[key] for key in ESTIMATOR_KEYS}
+    estimators['model_version'] = artifact['model_version']
+    _dump(estimators, _estimators_path(model_path))
+    _dump({key: value for key, value in artifact.items()
+           if key not in ESTIMATOR_KEYS and key != 'estimators_path'}, model_path)
+
+def load_model(model_path=MODEL_PATH):
+    """
+    Load a model artifact from disk and make it the active one.
+    
+    The NumPy arrays (compiled forests, scaler, percentiles) are memory-mapped
+    read-only, so every worker process serving the same file shares one copy
+    of them through the page cache. The sklearn models are loaded on first
+    use by get_estimators.
+    
+    Raises:
+        FileNotFoundError: If there is no artifact at model_path
+        ValueError: If the artifact was written by an incompatible version
+    """
+    artifact = joblib.load(model_path, mmap_mode='r')
+    if artifact.get('artifact_version') != ARTIFACT_VERSION:
+        raise ValueError(
+            f"Model artifact {model_path} has version {artifact.get('artifact_version')}, "
+            f"expected {ARTIFACT_VERSION}. Retrain with 'python surgery_scheduler.py train'."
+        )
+    artifact['estimators_path'] = _estimators_path(model_path)
+    set_model_artifact(artifact)
+    return artifact
+
+def set_model_artifact(artifact):
+    """Swap the artifact used for predictions."""
+    global _artifact, _encoder
+    _encoder = FeatureEncoder.from_artifact(artifact)
+    _artifact = artifact
+    _prediction_cache.clear()
+
+def get_model_artifact():
+    """
+    Return the active model artifact, loading it on first use.
+    
+    Models are only trained by the train command, never by a process that
+    serves predictions, so every worker serves the one artifact on disk.
+    
+    Raises:
+        FileNotFoundError: If there is no artifact at MODEL_PATH
+    """
+    if _artifact is None:
+        with _artifact_lock:
+            if _artifact is None:
+                if not os.path.exists(MODEL_PATH):
+                    raise FileNotFoundError(
+                        f"No model artifact at {MODEL_PATH}. Train one with 'python surgery_scheduler.py train'."
+                    )
+                load_model(MODEL_PATH)
+    return _artifact
+
+def get_estimators(artifact=None):
+    """
+    Return the fitted sklearn models of an artifact, loading them on first use.
+    
+    Args:
+        artifact (dict, optional): Defaults to the active artifact
+    
+    Returns:
+        tuple: (delay_model, duration_model)
+    
+    Raises:
+        ValueError: If the estimator file belongs to a different model version
+    """
+    if artifact is None:
+        artifact = get_model_artifact()
+    if 'delay_model' not in artifact:
+        with _estimator_lock:
+            if 'delay_model' not in artifact:
+                estimators = joblib.load(artifact['estimators_path'])
+                if estimators['model_version'] != artifact['model_version']:
+                    raise ValueError(
+                        f"{artifact['estimators_path']} holds model version {estimators['model_version']}, "
+                        f"expected {artifact['model_version']}; reload the model."
+                    )
+                # delay_model is the flag checked above, so it is set last
+                artifact['duration_model'] = estimators['duration_model']
+                artifact['delay_model'] = estimators['delay_model']
+    return artifact['delay_model'], artifact['duration_model']
+
+def get_feature_encoder():
+    """Return the feature encoder for the active model artifact."""
+    get_model_artifact()
+    return _encoder
+
+def set_inference_engine(engine):
+    """Select how the forests are scored: 'sklearn' or 'compiled'."""
+    global _inference_engine
+    if engine not in INFERENCE_ENGINES:
+        raise ValueError(f"Unknown inference engine {engine!r}, expected one of {INFERENCE_ENGINES}")
+    _inference_engine = engine
+
+def get_inference_engine():
+    return _inference_engine
+
+def _use_compiled(artifact):
+    return _inference_engine == 'compiled' and artifact['compiled_models']['validated']
+
+def _predict_delay_proba(artifact, X):
+    """Probability of the delayed class for every row of a scaled feature matrix."""
+    if _use_compiled(artifact):
+        return forest_compiler.predict_forest(artifact['compiled_models']['delay_model'], X)[:, 1]
+    return get_estimators(artifact)[0].predict_proba(X)[:, 1]
+
+def _predict_duration(artifact, X):
+    """Raw duration model output for every row of a scaled feature matrix."""
+    if _use_compiled(artifact):
+        return forest_compiler.predict_forest(artifact['compiled_models']['duration_model'], X)
+    return get_estimators(artifact)[1].predict(X)
 
-# Train models
-delay_model.fit(X_train_scaled, y_delay_train)
-duration_model.fit(X_train_scaled, y_time_train)
+def prediction_cache_info():
+    """Return hit/miss counters and size of the prediction cache, plus the model version."""
+    info = _prediction_cache.info()
+    info['model_version'] = _artifact['model_version'] if _artifact is not None else None
+    return info
 
-# Evaluate models
-print("\nDelay Prediction Model Performance:")
-print(classification_report(y_delay_test, delay_model.predict(X_test_scaled)))
+def memory_usage():
+    """
+    Memory of this process in MB, from /proc/self/status.
+    
+    'shared_file' is resident memory backed by files, such as the memory-mapped
+    model arrays, which the page cache shares between worker processes;
+    'private' is what this process holds on its own. Returns None where /proc
+    is not available.
+    """
+    fields = {'VmRSS': 'rss', 'RssAnon': 'private', 'RssFile': 'shared_file', 'VmHWM': 'peak_rss'}
+    try:
+        with open('/proc/self/status') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    
+    usage = {'pid': os.getpid()}
+    for line in lines:
+        key, _, value = line.partition(':')
+        if key in fields:
+            usage[fields[key]] = int(value.split()[0]) / 1024
+    usage['sklearn_models_loaded'] = _artifact is not None and 'delay_model' in _artifact
+    return usage
 
-print("\nSurgery Duration Model Performance:")
-mae = mean_absolute_error(y_time_test, duration_model.predict(X_test_scaled))
-rmse = np.sqrt(mean_squared_error(y_time_test, duration_model.predict(X_test_scaled)))
-print(f'Mean Absolute Error: {mae:.2f} minutes')
-print(f'Root Mean Squared Error: {rmse:.2f} minutes')
+def clear_prediction_cache():
+    _prediction_cache.clear()
 
-# Cross-validation scores
-delay_cv_scores = cross_val_score(delay_model, X_train_scaled, y_delay_train, cv=5)
-duration_cv_scores = cross_val_score(duration_model, X_train_scaled, y_time_train, cv=5)
+def __getattr__(name):
+    # Keep the old module-level names (feature_cols, scaler, rmse, ...) working
+    if name in ESTIMATOR_KEYS:
+        return get_estimators()[ESTIMATOR_KEYS.index(name)]
+    if name in ARTIFACT_ATTRIBUTES:
+        return get_model_artifact()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def get_model_metrics():
+    """
+    Return the evaluation metrics stored with the active model.
+    
+    Cross-validation only runs in the train command; 'cross_validation' is
+    None for a model trained with --skip-cv.
+    """
+    return get_model_artifact()['metrics']
 
-print("\nCross-validation Scores:")
-print(f"Delay Model: {delay_cv_scores.mean():.3f} (+/- {delay_cv_scores.std() * 2:.3f})")
-print(f"Duration Model: {duration_cv_scores.mean():.3f} (+/- {duration_cv_scores.std() * 2:.3f})")
+def format_classification_report(report):
+    """Render a classification_report(output_dict=True) result as the usual text table."""
+    lines = [f"{'':>12}{'precision':>10}{'recall':>10}{'f1-score':>10}{'support':>10}", ""]
+    summary = ('accuracy', 'macro avg', 'weighted avg')
+    for label, row in report.items():
+        if label not in summary:
+            lines.append(f"{label:>12}{row['precision']:>10.2f}{row['recall']:>10.2f}"
+                         f"{row['f1-score']:>10.2f}{row['support']:>10.0f}")
+    lines.append("")
+    support = report['macro avg']['support']
+    lines.append(f"{'accuracy':>12}{'':>20}{report['accuracy']:>10.2f}{support:>10.0f}")
+    for label in summary[1:]:
+        row = report[label]
+        lines.append(f"{label:>12}{row['precision']:>10.2f}{row['recall']:>10.2f}"
+                     f"{row['f1-score']:>10.2f}{row['support']:>10.0f}")
+    return "\n".join(lines)
+
+def display_model_performance():
+    """Display model performance metrics and plots. Only call this when needed."""
+    artifact = get_model_artifact()
+    metrics = get_model_metrics()
+    
+    print("\nDelay Prediction Model Performance:")
+    print(format_classification_report(metrics['delay_report']))
+    
+    print("\nSurgery Duration Model Performance:")
+    print(f"Mean Absolute Error: {metrics['mae']:.2f} minutes")
+    print(f"Root Mean Squared Error: {metrics['rmse']:.2f} minutes")
+    
+    print("\nCross-validation Scores:")
+    cross_validation = metrics['cross_validation']
+    if cross_validation is not None:
+        delay_cv, duration_cv = cross_validation['delay'], cross_validation['duration']
+        print(f"Delay Model: {delay_cv['mean']:.3f} (+/- {delay_cv['std'] * 2:.3f})")
+        print(f"Duration Model: {duration_cv['mean']:.3f} (+/- {duration_cv['std'] * 2:.3f})")
+    else:
+        print("Not available: the model was trained with --skip-cv")
+    
+    delay_model, duration_model = get_estimators(artifact)
+    plot_feature_importance(delay_model, artifact['feature_cols'], "Delay Prediction")
+    plot_feature_importance(duration_model, artifact['feature_cols'], "Duration Prediction")
 
 # Feature importance analysis
 def plot_feature_importance(model, feature_names, title):
@@ -168,47 +1083,35 @@ def plot_feature_importance(model, feature_names, title):
     plt.tight_layout()
     plt.show()
 
-plot_feature_importance(delay_model, feature_cols, "Delay Prediction")
-plot_feature_importance(duration_model, feature_cols, "Duration Prediction")
-
 def predict_surgery(surgery_data):
     """
     Predict surgery delay and duration for new cases.
     
     Args:
         surgery_data (dict): Dictionary containing surgery information
-        
+    
     Returns:
         dict: Predictions including delay probability and estimated duration
     """
-    # Create a DataFrame with the new surgery data
-    df_new = pd.DataFrame([surgery_data])
+    artifact = get_model_artifact()
+    rmse = artifact['rmse']
     
     # Set a default duration based on surgery type and complexity if not predicted
-    base_duration = (df_new['Pre-op Prep Time (min)'].iloc[0] +
-                    df_new['Transfer to OR Time (min)'].iloc[0] +
-                    df_new['Anesthesia Time (min)'].iloc[0] +
-                    df_new['Positioning Time (min)'].iloc[0])
-    
-    # Add dummy Actual Start if not provided (for prediction only)
-    if 'Actual Start' not in df_new.columns:
-        df_new['Actual Start'] = df_new['Scheduled Start']
-    
-    # Preprocess input data
-    df_new_processed = preprocess_data(df_new, is_training=False)
+    base_duration = sum(surgery_data[col] for col in BASE_DURATION_COLS)
     
-    # Ensure all feature columns exist
-    for col in feature_cols:
-        if col not in df_new_processed.columns:
-            df_new_processed[col] = 0
+    # Encode straight into a scaled feature row
+    X_new_scaled = get_feature_encoder().encode(surgery_data)[np.newaxis, :]
     
-    # Select features and scale
-    X_new = df_new_processed[feature_cols]
-    X_new_scaled = scaler.transform(X_new)
-    
-    # Make predictions
-    delay_prob = delay_model.predict_proba(X_new_scaled)[0][1]
-    duration_pred = max(base_duration, duration_model.predict(X_new_scaled)[0])
+    # The encoded row captures every input the models (and base_duration) depend on
+    cache_key = (artifact['model_version'], X_new_scaled.tobytes())
+    cached = _prediction_cache.get(cache_key)
+    if cached is not None:
+        delay_prob, duration_pred = cached
+    else:
+        # Make predictions
+        delay_prob = _predict_delay_proba(artifact, X_new_scaled)[0]
+        duration_pred = max(base_duration, _predict_duration(artifact, X_new_scaled)[0])
+        _prediction_cache.put(cache_key, (delay_prob, duration_pred))
     
     return {
         'Delay_Probability': round(delay_prob, 2),
@@ -217,28 +1120,148 @@ def predict_surgery(surgery_data):
         'Duration_Range': f"{round(duration_pred - rmse, 1)} - {round(duration_pred + rmse, 1)}"
     }
 
-# Example usage
-example_surgery = {
-    'Patient Age': 65,
-    'BMI': 28.5,
-    'Surgery Type': 'Hip Replacement',
-    'Surgeon': 'Dr. Smith',
-    'Anesthesiologist': 'Dr. Brown',
-    'Nurse': 'Nurse A',
-    'Day of Week': 'Monday',
-    'Hour': 9,
-    'Pre-op Prep Time (min)': 45,
-    'Transfer to OR Time (min)': 10,
-    'Anesthesia Time (min)': 25,
-    'Positioning Time (min)': 20,
-    'Comorbidities': 'Hypertension',
-    'Instrument Ready (Y/N)': 'Y',
-    'PACU Bed Ready (Y/N)': 'Y',
-    'Scheduled Start': '2025-03-10 09:00:00'
-}
+def predict_surgeries(surgeries):
+    """
+    Predict delay and duration for many surgeries with one call per model.
+    
+    Args:
+        surgeries: DataFrame or list of dictionaries with the same fields as predict_surgery
+    
+    Returns:
+        DataFrame: One row per surgery, aligned with the input, with the same
+        columns as the predict_surgery result
+    """
+    artifact = get_model_artifact()
+    rmse = artifact['rmse']
+    
+    if isinstance(surgeries, pd.DataFrame):
+        df_new = surgeries
+    else:
+        df_new = pd.DataFrame(list(surgeries))
+    
+    if df_new.empty:
+        return pd.DataFrame(columns=['Delay_Probability', 'Predicted_Delay',
+                                     'Predicted_Duration', 'Duration_Range'])
+    
+    # Set a default duration based on surgery type and complexity if not predicted
+    base_duration = df_new[BASE_DURATION_COLS].sum(axis=1).to_numpy()
+    
+    X_new_scaled = get_feature_encoder().encode_frame(df_new)
+    
+    # Serve repeated surgeries from the cache and run the models only on the rest
+    model_version = artifact['model_version']
+    cache_keys = [(model_version, row.tobytes()) for row in X_new_scaled]
+    delay_prob = np.empty(len(df_new))
+    duration_pred = np.empty(len(df_new))
+    missing = []
+    for i, key in enumerate(cache_keys):
+        cached = _prediction_cache.get(key)
+        if cached is None:
+            missing.append(i)
+        else:
+            delay_prob[i], duration_pred[i] = cached
+    
+    if missing:
+        X_missing = X_new_scaled[missing]
+        delay_prob[missing] = _predict_delay_proba(artifact, X_missing)
+        duration_pred[missing] = np.maximum(base_duration[missing], _predict_duration(artifact, X_missing))
+        for i in missing:
+            _prediction_cache.put(cache_keys[i], (delay_prob[i], duration_pred[i]))
+    
+    return pd.DataFrame({
+        'Delay_Probability': np.round(delay_prob, 2),
+        'Predicted_Delay': np.where(delay_prob > 0.5, 'High Risk', 'Low Risk'),
+        'Predicted_Duration': np.round(duration_pred, 1),
+        'Duration_Range': [f"{round(d - rmse, 1)} - {round(d + rmse, 1)}" for d in duration_pred]
+    }, index=df_new.index)
+
+def predict_surgery_trees(surgeries):
+    """
+    Predict delay probability and duration for many surgeries, tree by tree.
+    
+    The spread over the trees of each forest describes how uncertain a
+    prediction is; their mean is what predict_surgeries returns (before
+    rounding), except where a tree's duration falls below the base duration,
+    which is floored per tree.
+    
+    Args:
+        surgeries: DataFrame or list of dictionaries with the same fields as predict_surgery
+    
+    Returns:
+        tuple: (delay_prob, duration) arrays of shape (n_surgeries, n_trees)
+    """
+    artifact = get_model_artifact()
+    
+    if isinstance(surgeries, pd.DataFrame):
+        df_new = surgeries
+    else:
+        df_new = pd.DataFrame(list(surgeries))
+    
+    base_duration = df_new[BASE_DURATION_COLS].sum(axis=1).to_numpy()
+    X_new_scaled = get_feature_encoder().encode_frame(df_new)
+    
+    if _use_compiled(artifact):
+        compiled_models = artifact['compiled_models']
+        delay_prob = forest_compiler.tree_values(compiled_models['delay_model'], X_new_scaled)[:, :, 1]
+        duration = forest_compiler.tree_values(compiled_models['duration_model'], X_new_scaled)[:, :, 0]
+    else:
+        delay_model, duration_model = get_estimators(artifact)
+        delay_prob = np.column_stack([tree.predict_proba(X_new_scaled)[:, 1] for tree in delay_model.estimators_])
+        duration = np.column_stack([tree.predict(X_new_scaled) for tree in duration_model.estimators_])
+    return delay_prob, np.maximum(base_duration[:, np.newaxis], duration)
+
+def main():
+    parser = argparse.ArgumentParser(description="Surgery delay and duration models")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    train_parser = subparsers.add_parser('train', help="Train the models and save the artifact")
+    train_parser.add_argument('--data', default=DATA_PATH, help="CSV file with historical cases")
+    train_parser.add_argument('--output', default=MODEL_PATH, help="Where to write the model artifact")
+    train_parser.add_argument('--skip-cv', action='store_true',
+                              help="Skip cross-validation (the saved metrics then have no CV scores)")
+    train_parser.add_argument('--n-jobs', type=int, default=-1, help="Cores to train on (-1 for all)")
+    train_parser.add_argument('--chunksize', type=int, help="Read the CSV in chunks of this many rows")
+    train_parser.add_argument('--sample-size', type=int, help="Train on a stratified sample of this many cases")
+    
+    args = parser.parse_args()
+    
+    if args.command == 'train':
+        artifact = train(args.data, args.output, cross_validate=not args.skip_cv, n_jobs=args.n_jobs,
+                         chunksize=args.chunksize, sample_size=args.sample_size)
+        print(f"Saved model {artifact['model_version']} to {args.output}")
+        for stage, seconds in artifact['timings'].items():
+            print(f"  {stage:<20} {seconds:8.2f} s")
+        stats = artifact['training_stats']
+        print(f"Trained on {stats['rows_used']} of {stats['rows_read']} cases, peak RSS {stats['peak_rss_mb']:.0f} MB")
+        return
+    
+    display_model_performance()
+    
+    # Example usage
+    example_surgery = {
+        'Patient Age': 65,
+        'BMI': 28.5,
+        'Surgery Type': 'Hip Replacement',
+        'Surgeon': 'Dr. Smith',
+        'Anesthesiologist': 'Dr. Brown',
+        'Nurse': 'Nurse A',
+        'Day of Week': 'Monday',
+        'Hour': 9,
+        'Pre-op Prep Time (min)': 45,
+        'Transfer to OR Time (min)': 10,
+        'Anesthesia Time (min)': 25,
+        'Positioning Time (min)': 20,
+        'Comorbidities': 'Hypertension',
+        'Instrument Ready (Y/N)': 'Y',
+        'PACU Bed Ready (Y/N)': 'Y',
+        'Scheduled Start': '2025-03-10 09:00:00'
+    }
+    
+    prediction = predict_surgery(example_surgery)
+    print("\nExample Prediction:")
+    print(f"Delay Risk: {prediction['Predicted_Delay']} (Probability: {prediction['Delay_Probability']})")
+    print(f"Estimated Duration: {prediction['Predicted_Duration']} minutes")
+    print(f"Duration Range: {prediction['Duration_Range']} minutes")
 
-prediction = predict_surgery(example_surgery)
-print("\nExample Prediction:")
-print(f"Delay Risk: {prediction['Predicted_Delay']} (Probability: {prediction['Delay_Probability']})")
-print(f"Estimated Duration: {prediction['Predicted_Duration']} minutes")
-print(f"Duration Range: {prediction['Duration_Range']} minutes") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
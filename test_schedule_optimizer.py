@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import surgery_scheduler
+from surgery_scheduler import get_estimators, get_model_artifact, predict_surgeries, predict_surgery, preprocess_data
+from schedule_optimizer import SurgeryScheduleOptimizer
+from schedule_session import ScheduleSession, _BUFFER
+
+try:
+    get_model_artifact()
+except FileNotFoundError:
+    pytest.skip("needs a trained model: run 'python surgery_scheduler.py train'", allow_module_level=True)
+
+START_DATE = datetime(2025, 3, 10)  # a Monday
+
+def create_week(n, seed=0):
+    """Historical cases re-dated to START_DATE's week (Saturday requests included), with staff shared between roles."""
+    df = pd.read_csv(surgery_scheduler.DATA_PATH).sample(n=n, random_state=seed).reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    scheduled = pd.to_datetime(df['Scheduled Start'])
+    dates = [START_DATE + timedelta(days=int(day)) for day in rng.integers(0, 6, size=n)]
+    df['Scheduled Start'] = [date.replace(hour=time.hour, minute=time.minute).strftime('%Y-%m-%d %H:%M:%S')
+                             for date, time in zip(dates, scheduled)]
+    df['Day of Week'] = [date.strftime('%A') for date in dates]
+    # A small pool of names across all roles, so staff conflicts actually come up
+    people = [f"Dr. {name}" for name in ('Smith', 'Brown', 'Davis', 'Lee', 'Wilson', 'Garcia', 'Chen', 'Patel')]
+    for role in ('Surgeon', 'Anesthesiologist', 'Nurse'):
+        df[role] = rng.choice(people, size=n)
+    columns = ['Patient Age', 'BMI', 'Surgery Type', 'Surgeon', 'Anesthesiologist', 'Nurse', 'Day of Week',
+               'Pre-op Prep Time (min)', 'Transfer to OR Time (min)', 'Anesthesia Time (min)',
+               'Positioning Time (min)', 'Comorbidities', 'Instrument Ready (Y/N)', 'PACU Bed Ready (Y/N)',
+               'Scheduled Start', 'Total OR Time (min)']
+    return df[columns].to_dict('records')
+
+def reference_score(surgery, prediction, slot_datetime):
+    """The original one-slot scoring rules, kept here as the reference for _score_slots."""
+    score = 0
+    
+    if surgery['Patient Age'] > 70:
+        score += 20
+    elif surgery['Patient Age'] > 60:
+        score += 15
+    
+    complexity = (surgery['Pre-op Prep Time (min)'] +
+                  surgery['Anesthesia Time (min)'] +
+                  surgery['Positioning Time (min)']) / 3
+    if complexity > 60:
+        score += 15
+    
+    if complexity > 45 and slot_datetime.hour < 11:
+        score += 10
+    
+    scheduled_start = pd.to_datetime(surgery['Scheduled Start'])
+    time_diff = abs((slot_datetime - scheduled_start).total_seconds() / 3600)
+    if time_diff < 1:
+        score += 50
+    elif time_diff < 2:
+        score += 30
+    elif time_diff < 4:
+        score += 10
+    
+    if slot_datetime.date() == scheduled_start.date():
+        score += 40
+    
+    if surgery['Patient Age'] > 65 and slot_datetime.hour < 10:
+        score += 15
+    
+    if prediction['Predicted_Delay'] == 'High Risk':
+        score -= 20
+    
+    return score
+
+def test_score_slots_matches_reference_rules():
+    optimizer = SurgeryScheduleOptimizer()
+    surgeries = create_week(30, seed=1)
+    predictions = predict_surgeries(surgeries)
+    # Every 15 minutes of two days, plus starts exactly 1, 2 and 4 hours (and a minute either side) away
+    slots = [START_DATE + timedelta(days=day, hours=7, minutes=15 * i) for day in range(2) for i in range(48)]
+    for position, surgery in enumerate(surgeries):
+        prediction = predictions.iloc[position].to_dict()
+        scheduled_start = pd.to_datetime(surgery['Scheduled Start'])
+        candidates = slots + [scheduled_start + timedelta(hours=sign * hours, minutes=nudge)
+                              for sign in (-1, 1) for hours in (1, 2, 4) for nudge in (-1, 0, 1)]
+        scores = optimizer._score_slots(surgery, prediction, np.array(candidates, dtype='datetime64[us]'))
+        expected = [reference_score(surgery, prediction, slot) for slot in candidates]
+        assert scores.tolist() == expected
+        assert optimizer._calculate_surgery_score(surgery, candidates[0], prediction) == expected[0]
+
+def test_batch_prediction_matches_single_and_reference():
+    surgeries = create_week(25, seed=2)
+    artifact = get_model_artifact()
+    delay_model, duration_model = get_estimators()
+    surgery_scheduler.clear_prediction_cache()
+    batch = predict_surgeries(surgeries)
+    for position, surgery in enumerate(surgeries):
+        single = predict_surgery(surgery)
+        assert batch.iloc[position].to_dict() == single
+        
+        # The original prediction path: preprocess_data, then the scaler and the sklearn models
+        df_new = preprocess_data(pd.DataFrame([surgery]), is_training=False)
+        X_new = df_new.reindex(columns=artifact['feature_cols'], fill_value=0)
+        X_new_scaled = artifact['scaler'].transform(X_new)
+        base_duration = sum(surgery[col] for col in surgery_scheduler.BASE_DURATION_COLS)
+        delay_prob = delay_model.predict_proba(X_new_scaled)[0][1]
+        duration_pred = max(base_duration, duration_model.predict(X_new_scaled)[0])
+        assert single['Delay_Probability'] == pytest.approx(round(delay_prob, 2), abs=0.01)
+        assert single['Predicted_Delay'] == ('High Risk' if delay_prob > 0.5 else 'Low Risk')
+        assert single['Predicted_Duration'] == pytest.approx(round(duration_pred, 1), abs=0.1)
+
+def assert_no_overlap(optimizer, schedule_df, surgeries):
+    """No OR, staff member or PACU bed limit is double-booked in any slot of the schedule."""
+    assert not schedule_df.empty
+    slots_per_day = (optimizer.end_hour - optimizer.start_hour) * 60 // optimizer.slot_minutes
+    or_busy, staff_busy, pacu = {}, {}, {}
+    for index, row in schedule_df.iterrows():
+        surgery = surgeries[index]
+        hour, minute = map(int, row['Scheduled Time'].split(':'))
+        slot = ((hour - optimizer.start_hour) * 60 + minute) // optimizer.slot_minutes
+        total_time_needed = row['Estimated Duration'] + optimizer.cleanup_time
+        slots_needed = int(np.ceil(total_time_needed / optimizer.slot_minutes))
+        assert 0 <= slot and slot + slots_needed <= slots_per_day
+        
+        room = or_busy.setdefault((row['Scheduled Date'], row['Operating Room']), np.zeros(slots_per_day, dtype=int))
+        room[slot:slot + slots_needed] += 1
+        for member in {surgery[role] for role in optimizer.staff_roles}:
+            timeline = staff_busy.setdefault((row['Scheduled Date'], member), np.zeros(slots_per_day, dtype=int))
+            timeline[slot:slot + slots_needed] += 1
+        first, end = optimizer._recovery(surgery, total_time_needed)
+        beds = pacu.setdefault(row['Scheduled Date'], np.zeros(2 * slots_per_day, dtype=int))
+        beds[slot + first:slot + end] += 1
+    
+    assert max(room.max() for room in or_busy.values()) == 1
+    assert max(timeline.max() for timeline in staff_busy.values()) == 1
+    assert max(beds.max() for beds in pacu.values()) <= optimizer.pacu_beds
+    assert schedule_df.attrs['pacu_peak'] == {str(date.date()): int(pacu[date.date()].max())
+                                              if date.date() in pacu else 0
+                                              for date in pd.date_range(START_DATE, periods=5)}
+
+@pytest.mark.parametrize('engine', ['greedy', 'local_search', 'mip', 'multistart', 'day_parallel'])
+def test_engines_never_double_book(engine):
+    optimizer = SurgeryScheduleOptimizer()
+    optimizer.pacu_beds = 2
+    surgeries = create_week(30, seed=3)
+    if engine == 'greedy':
+        schedule_df = optimizer.create_weekly_schedule(surgeries, START_DATE)
+    elif engine == 'local_search':
+        schedule_df = optimizer.create_weekly_schedule(surgeries, START_DATE, improve_iterations=2000)
+    elif engine == 'mip':
+        schedule_df = optimizer.create_optimal_schedule(surgeries, START_DATE, time_limit=10)
+    elif engine == 'multistart':
+        schedule_df = optimizer.create_multistart_schedule(surgeries, START_DATE, runs=4, workers=1)
+    else:
+        schedule_df = optimizer.create_day_parallel_schedule(surgeries, START_DATE, workers=1)
+    assert_no_overlap(optimizer, schedule_df, surgeries)
+
+def calendar_state(session):
+    calendar = session.calendar
+    return (calendar.occupied.copy(), session.owner.copy(),
+            {member: busy.copy() for member, busy in calendar.staff_busy.items() if busy.any()},
+            np.trim_zeros(calendar.pacu.ravel(), 'b').copy())
+
+def assert_same_state(state, other):
+    assert np.array_equal(state[0], other[0])
+    assert np.array_equal(state[1], other[1])
+    assert state[2].keys() == other[2].keys()
+    assert all(np.array_equal(state[2][member], other[2][member]) for member in state[2])
+    assert np.array_equal(state[3], other[3])
+
+def test_session_add_cancel_move_round_trip():
+    surgeries = create_week(12, seed=4)
+    session = ScheduleSession(SurgeryScheduleOptimizer(), START_DATE, surgeries[:8])
+    before = calendar_state(session)
+    schedule_before = session.schedule()
+    
+    for surgery in surgeries[8:]:
+        case_id, _ = session.add(surgery)
+        session.cancel(case_id)
+    assert_same_state(before, calendar_state(session))
+    
+    # Move the first case that fits another slot there, then back
+    for case_id in schedule_before['Case ID']:
+        case = session.cases[case_id]
+        or_indices, days, starts = session.calendar.free_windows(
+            case['slots_needed'], range(len(session.days)), case['staff'], case['recovery']
+        )
+        if len(starts):
+            break
+    original = session._assignment(case['placement'])
+    target = session._assignment((days[0], or_indices[0], starts[0]))
+    changes = session.move(case_id, target['scheduled_date'], target['scheduled_time'], target['operating_room'])
+    assert changes[0]['before'] == original and changes[0]['after'] == target
+    session.move(case_id, original['scheduled_date'], original['scheduled_time'], original['operating_room'])
+    assert_same_state(before, calendar_state(session))
+    pd.testing.assert_frame_equal(session.schedule(), schedule_before)
+
+def test_cancelled_emergency_returns_buffer():
+    surgeries = create_week(25, seed=5)
+    session = ScheduleSession(SurgeryScheduleOptimizer(), START_DATE, surgeries[:20])
+    buffer_before = int((session.owner == _BUFFER).sum())
+    
+    for surgery in surgeries[20:]:
+        # A 90-minute case arriving 90 minutes before closing can only start in time by using the buffer
+        surgery['Total OR Time (min)'] = 60
+        case_id, changes = session.insert_emergency(surgery, arrival=START_DATE.replace(hour=15, minute=30))
+        assert changes[0]['case_id'] == case_id
+        assert int((session.owner == _BUFFER).sum()) < buffer_before
+        session.cancel(case_id)
+        assert int((session.owner == _BUFFER).sum()) == buffer_before
+        # Every slot the calendar holds is owned by a case or the buffer
+        assert np.array_equal(session.calendar.occupied, session.owner != -1)